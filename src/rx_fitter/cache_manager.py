@@ -0,0 +1,283 @@
+'''
+Module with CacheManager class
+'''
+import os
+import fcntl
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import pandas as pnd
+from dmu.logging.log_store import LogStore
+
+log=LogStore.add_logger('rx_fitter:cache_manager')
+
+# Files made by mkstemp are only readable by the owner, the cached files get the permissions of files made with open
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+#---------------------------
+class CacheManager:
+    '''
+    Class used to manage the directory where expensive objects are cached.
+
+    - The root directory can be set with the RXFITTER_CACHE_DIR environment variable, or with `apply_setting`
+    - The maximum size, in GB, can be set with RXFITTER_CACHE_MAXSIZE, or with `apply_setting`
+    - When the maximum size is exceeded, the least recently used files are removed
+    - Only the subdirectories listed in `l_kind` are managed
+    - `lock` and `atomic_path` are meant to be used when several jobs, or threads, share the cached files
+    - The lock files are removed together with the files they protect
+    '''
+    root     = os.environ.get('RXFITTER_CACHE_DIR', '/tmp/cache')
+    max_size = int(float(os.environ.get('RXFITTER_CACHE_MAXSIZE', '20')) * 1024 ** 3)
+    l_kind   = ['prec', 'decay_weights', 'rx_fits', 'pdg']
+
+    _d_hit  : dict[str,int] = {}
+    _d_miss : dict[str,int] = {}
+
+    _d_thread_lock : dict[str,threading.Lock] = {} # File locks do not exclude threads of the same process
+    _thread_lock                              = threading.Lock()
+    #---------------------------
+    @staticmethod
+    def get_dir(kind : str) -> str:
+        '''
+        Returns path to directory where objects of a given kind are cached, e.g. prec
+        '''
+        if kind not in CacheManager.l_kind:
+            raise ValueError(f'Invalid kind of cached object: {kind}')
+
+        dir_path = f'{CacheManager.root}/{kind}'
+        os.makedirs(dir_path, exist_ok=True)
+
+        return dir_path
+    #---------------------------
+    @staticmethod
+    def get_path(kind : str, name : str) -> str:
+        '''
+        Returns path to cached file
+
+        kind: Kind of object, e.g. prec
+        name: Name of file, e.g. pdf_1234.npy
+        '''
+        dir_path = CacheManager.get_dir(kind=kind)
+
+        return f'{dir_path}/{name}'
+    #---------------------------
+    @staticmethod
+    def _kind_from_path(path : str) -> str:
+        return os.path.basename(os.path.dirname(path))
+    #---------------------------
+    @staticmethod
+    def is_cached(path : str) -> bool:
+        '''
+        Returns true if the file exists. This is counted as a hit or a miss
+        and on hits the file is marked as recently used.
+        '''
+        kind = CacheManager._kind_from_path(path)
+
+        if not os.path.isfile(path):
+            CacheManager._d_miss[kind] = CacheManager._d_miss.get(kind, 0) + 1
+            return False
+
+        CacheManager._d_hit[kind] = CacheManager._d_hit.get(kind, 0) + 1
+        os.utime(path)
+
+        return True
+    #---------------------------
+    @staticmethod
+    def stored(path : str) -> None:
+        '''
+        Meant to be called after a file was added to the cache, will evict old files if needed
+        '''
+        log.debug(f'Stored: {path}')
+
+        CacheManager.prune()
+    #---------------------------
+    @staticmethod
+    def _get_files() -> list[tuple[str,str,float,int]]:
+        '''
+        Returns list of (kind, path, last use time, size) for all the cached files
+        '''
+        l_file = []
+        for kind in CacheManager.l_kind:
+            dir_path = f'{CacheManager.root}/{kind}'
+            if not os.path.isdir(dir_path):
+                continue
+
+            for entry in os.scandir(dir_path):
+                if not entry.is_file():
+                    continue
+
+                # Lock files might be held by other jobs and temporary files are being written
+                if entry.name.endswith('.lock') or entry.name.startswith('.tmp_'):
+                    continue
+
+                stat = entry.stat()
+                l_file.append((kind, entry.path, stat.st_mtime, stat.st_size))
+
+        return l_file
+    #---------------------------
+    @staticmethod
+    def prune(max_size : int | None = None) -> list[str]:
+        '''
+        Removes least recently used files until the cache is smaller than max_size
+
+        max_size: Size in bytes, if None, will use the `max_size` attribute
+
+        Returns list of removed files
+        '''
+        max_size = CacheManager.max_size if max_size is None else max_size
+        l_file   = CacheManager._get_files()
+        tot_size = sum(size for _, _, _, size in l_file)
+        if tot_size <= max_size:
+            return []
+
+        l_removed = []
+        for _, path, _, size in sorted(l_file, key=lambda entry : entry[2]):
+            if tot_size <= max_size:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                log.debug(f'Already removed: {path}')
+
+            CacheManager._remove_lock(path)
+
+            tot_size -= size
+            l_removed.append(path)
+
+        log.info(f'Removed {len(l_removed)} files from cache in: {CacheManager.root}')
+
+        return l_removed
+    #---------------------------
+    @staticmethod
+    def _remove_lock(path : str) -> None:
+        '''
+        Removes lock file associated to `path`, if it exists and no job holds it
+        '''
+        lock_path   = f'{path}.lock'
+        thread_lock = CacheManager._get_thread_lock(path)
+        if not os.path.isfile(lock_path):
+            return
+
+        # Closing any descriptor of the file would release the lock held by another thread of this process
+        if not thread_lock.acquire(blocking=False):
+            log.debug(f'Lock in use, not removing: {lock_path}')
+            return
+
+        try:
+            with open(lock_path, 'a', encoding='utf-8') as ofile:
+                try:
+                    fcntl.lockf(ofile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    log.debug(f'Lock in use, not removing: {lock_path}')
+                    return
+
+                os.remove(lock_path)
+                fcntl.lockf(ofile, fcntl.LOCK_UN)
+        finally:
+            thread_lock.release()
+    #---------------------------
+    @staticmethod
+    def _get_thread_lock(path : str) -> threading.Lock:
+        path = os.path.abspath(path)
+        with CacheManager._thread_lock:
+            if path not in CacheManager._d_thread_lock:
+                CacheManager._d_thread_lock[path] = threading.Lock()
+
+            return CacheManager._d_thread_lock[path]
+    #---------------------------
+    @staticmethod
+    def get_stats() -> pnd.DataFrame:
+        '''
+        Returns dataframe with number of files, size in MB, hits and misses, for each kind of cached object.
+        Hits and misses are the ones of the current process.
+        '''
+        l_file = CacheManager._get_files()
+        df     = pnd.DataFrame(l_file, columns=['kind', 'path', 'time', 'size'])
+
+        d_data = {'Kind' : [], 'Files' : [], 'Size [MB]' : [], 'Hits' : [], 'Misses' : []}
+        for kind in CacheManager.l_kind:
+            df_kind = df[df.kind == kind]
+
+            d_data['Kind'     ].append(kind)
+            d_data['Files'    ].append(len(df_kind))
+            d_data['Size [MB]'].append(df_kind['size'].sum() / 1024 ** 2)
+            d_data['Hits'     ].append(CacheManager._d_hit.get(kind , 0))
+            d_data['Misses'   ].append(CacheManager._d_miss.get(kind, 0))
+
+        return pnd.DataFrame(d_data)
+    #---------------------------
+    @staticmethod
+    @contextmanager
+    def lock(path : str):
+        '''
+        Context manager holding an exclusive lock associated to a file, across threads, processes and nodes
+        sharing the file system. Meant to be used such that the first job creates the file and the
+        others wait and reuse it, e.g.:
+
+        with CacheManager.lock(path):
+            if not os.path.isfile(path):
+                _make_file(path)
+
+            _read_file(path)
+        '''
+        dir_path  = os.path.dirname(path)
+        lock_path = f'{path}.lock'
+        os.makedirs(dir_path, exist_ok=True)
+
+        with CacheManager._get_thread_lock(path), open(lock_path, 'a', encoding='utf-8') as ofile:
+            log.debug(f'Acquiring lock: {lock_path}')
+            fcntl.lockf(ofile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(ofile, fcntl.LOCK_UN)
+                log.debug(f'Released lock: {lock_path}')
+    #---------------------------
+    @staticmethod
+    @contextmanager
+    def atomic_path(path : str):
+        '''
+        Context manager providing a temporary path, in the same directory and with the same extension as `path`.
+        When the context exits without errors, the temporary file is renamed to `path`, otherwise it is removed.
+        Thus, readers never see partially written files.
+        '''
+        dir_path  = os.path.dirname(path)
+        _, ext    = os.path.splitext(path)
+        os.makedirs(dir_path, exist_ok=True)
+
+        fdesc, tmp_path = tempfile.mkstemp(dir=dir_path, prefix='.tmp_', suffix=ext)
+        os.close(fdesc)
+        try:
+            yield tmp_path
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    #---------------------------
+    @staticmethod
+    @contextmanager
+    def apply_setting(root : str | None = None, max_size : int | None = None):
+        '''
+        Used to override default behaviour
+
+        root    : Directory where the cache will be
+        max_size: Maximum size of the cache in bytes
+        '''
+        old_root = CacheManager.root
+        old_size = CacheManager.max_size
+        try:
+            if root is not None:
+                CacheManager.root = root
+
+            if max_size is not None:
+                CacheManager.max_size = max_size
+
+            yield
+        finally:
+            CacheManager.root     = old_root
+            CacheManager.max_size = old_size
+#---------------------------
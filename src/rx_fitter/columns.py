@@ -0,0 +1,21 @@
+'''
+Module with functions used to find which columns need to be read from the ROOT files
+'''
+import re
+
+# Names not followed by a parenthesis or by ::, i.e. not functions or namespaces
+_COLUMN_REGEX = re.compile(r'\b([A-Za-z_]\w*)\b(?!\s*\(|::)')
+_KEYWORDS     = {'true', 'false', 'and', 'or', 'not'}
+#---------------------------
+def from_expressions(l_expr : list[str]) -> list[str]:
+    '''
+    Returns sorted list with names of the columns used in expressions, e.g. cuts
+
+    l_expr: List of expressions, e.g. ['(abs(B_TRUEID) == 521) && (q2 > 1e6)']
+    '''
+    s_column = set()
+    for expr in l_expr:
+        s_column.update(_COLUMN_REGEX.findall(expr))
+
+    return sorted(s_column - _KEYWORDS)
+#---------------------------
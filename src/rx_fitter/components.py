@@ -19,8 +19,11 @@ from dmu.generic                                 import utilities as gut
 from rx_selection                                import selection as sel
 from rx_data.rdf_getter                          import RDFGetter
 from rx_calibration.hltcalibration.fit_component import FitComponent
+from rx_fitter                                   import columns as rcol
 from rx_fitter.mc_par_pdf                        import MCParPdf
 from rx_fitter.prec                              import PRec
+from rx_fitter.template_pdf                      import tabulate
+from rx_fitter.cache_manager                     import CacheManager
 
 log = LogStore.add_logger('rx_fitter:components')
 # ------------------------------------
@@ -28,23 +31,35 @@ class Data:
     '''
     Data class
     '''
-    cache_dir = '/tmp/cache/rx_fits'
+    template_points = 0 # If larger than zero, the KDEs from get_kde are tabulated in this many points and interpolated when evaluated
 # ---------------------------------
-def get_rdf(sample : str, q2bin : str, trigger : str, smeared : bool = True) -> RDataFrame:
+def get_rdf(
+        sample  : str,
+        q2bin   : str,
+        trigger : str,
+        smeared : bool = True,
+        columns : Union[list[str],None] = None) -> RDataFrame:
     '''
     Function that returns a ROOT dataframe for a given dataset, MC or real data
 
     smeared will control on what Jpsi and B masses the selection will be applied.
     If true (default) the cut will be in smeared masses, IF MC electron.
+
+    columns: If passed, only these columns and the ones needed by the selection will be read
     '''
-    gtr  = RDFGetter(sample=sample, trigger=trigger)
-    rdf  = gtr.get_rdf()
     d_sel= sel.selection(
             smeared=smeared,
             trigger=trigger,
             q2bin  =q2bin,
             process=sample)
 
+    if columns is not None:
+        columns = sorted(set(columns) | set(rcol.from_expressions(list(d_sel.values()))))
+        log.debug(f'Reading columns: {columns}')
+
+    gtr  = RDFGetter(sample=sample, trigger=trigger)
+    rdf  = gtr.get_rdf(columns=columns)
+
     for cut_name, cut_value in d_sel.items():
         log.debug(f'{cut_name:<20}{cut_value}')
         rdf = rdf.Filter(cut_value, cut_name)
@@ -259,8 +274,23 @@ def get_kde(obs : zobs, sample : str, cfg : dict) -> zpdf:
     cfg['plotting']= d_plt
     cfg['out_dir'] = out_dir
 
-    if os.path.isfile(f'{out_dir}/data.json'):
-        data_path = f'{out_dir}/data.json'
+    # FitComponent writes data.json, jobs sharing out_dir wait for the first one to write it
+    data_path = f'{out_dir}/data.json'
+    with CacheManager.lock(data_path):
+        pdf = _get_kde_pdf(obs, sample, cfg, data_path=data_path)
+
+    if pdf is None or Data.template_points <= 0:
+        return pdf
+
+    return tabulate(pdf, npoints=Data.template_points)
+# ------------------------------------
+def _get_kde_pdf(obs : zobs, sample : str, cfg : dict, data_path : str) -> zpdf:
+    mass     = obs.obs[0]
+    smeared  = '_smr_' in mass
+    q2bin    = cfg['input']['q2bin']
+    trigger  = cfg['input']['trigger']
+
+    if os.path.isfile(data_path):
         log.debug(f'JSON file with data found, loading: {data_path}')
 
         df        = pnd.read_json(data_path)
@@ -278,7 +308,8 @@ def get_kde(obs : zobs, sample : str, cfg : dict) -> zpdf:
             smeared=smeared,
             sample =sample,
             q2bin  =q2bin,
-            trigger=trigger)
+            trigger=trigger,
+            columns=[mass])
 
     fcm = FitComponent(cfg=cfg, rdf=rdf, pdf=None, obs=obs)
     pdf = fcm.get_pdf()
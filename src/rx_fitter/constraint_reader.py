@@ -1,6 +1,10 @@
 '''
 Script holding ConstraintReader class
 '''
+import math
+
+import numpy
+
 from dmu.logging.log_store       import LogStore
 from rx_efficiencies.decay_names import DecayNames as dn
 from rx_fitter.signal_scales     import FitParameters
@@ -23,22 +27,28 @@ class ConstraintReader:
         self._q2bin   = q2bin
 
         self._d_const = {}
+        self._l_block : list[tuple[list[str],numpy.ndarray]] = [] # Names of parameters constrained together and their covariance
         self._signal  = 'bpkpee' # This is the signal decay nickname, needed for PRec scales constraints
+        self._initialized = False
     # -------------------------------------------------------------
     def _add_signal_constraints(self) -> None:
         obj = FitParameters()
 
+        l_sig = [ par for par in self._l_par if 'Signal' in par ]
+        if len(l_sig) > 0:
+            arr_val, cov = obj.get_parameter_scales(names=l_sig)
+            self._l_block.append((l_sig, cov))
+            for par, val, var in zip(l_sig, arr_val, numpy.diag(cov)):
+                log.debug(f'Adding constrint for: {par}')
+                self._d_const[par] = float(val), math.sqrt(var)
+
         for par in self._l_par:
-            if 'Signal' in par:
-                val, err = obj.get_parameter_scale(name=par)
-            elif par.startswith('frac_brem_'):
-                val, err = obj.get_brem_fraction(name=par)
-            else:
+            if not par.startswith('frac_brem_'):
                 continue
 
             log.debug(f'Adding constrint for: {par}')
 
-            self._d_const[par] = val, err
+            self._d_const[par] = obj.get_brem_fraction(name=par)
     # -------------------------------------------------------------
     def _proc_from_par(self, par_name : str) -> str:
         sample = par_name[1:] # Parameter name is expected to look like sSAMPLE_NICKNAME
@@ -47,6 +57,7 @@ class ConstraintReader:
         return decay
     # -------------------------------------------------------------
     def _add_prec_constraints(self) -> None:
+        l_par = []
         for par in self._l_par:
             if not par.startswith('s'): # PRec constraints are scales, starting with "s"
                 continue
@@ -61,12 +72,31 @@ class ConstraintReader:
                 continue
 
             log.debug(f'Adding constrint for: {par}')
+            l_par.append(par)
+
+        if len(l_par) == 0:
+            return
+
+        # All the scales are calculated together, the inputs are loaded once
+        l_proc       = [ self._proc_from_par(par) for par in l_par ]
+        obj          = PrecScales(q2bin=self._q2bin)
+        arr_val, cov = obj.get_scales(procs=l_proc, signal=self._signal)
+        self._l_block.append((l_par, cov))
+
+        for par, val, var in zip(l_par, arr_val, numpy.diag(cov)):
+            self._d_const[par] = float(val), math.sqrt(var)
+    # -------------------------------------------------------------
+    def _initialize(self) -> None:
+        if self._initialized:
+            return
+
+        self._add_signal_constraints()
+        self._add_prec_constraints()
 
-            process  = self._proc_from_par(par)
-            obj      = PrecScales(proc=process, q2bin=self._q2bin)
-            val, err = obj.get_scale(signal=self._signal)
+        # Parameters constrained together are added in blocks, the constraints follow the order of the parameters
+        self._d_const = { par : self._d_const[par] for par in self._l_par if par in self._d_const }
 
-            self._d_const[par] = val, err
+        self._initialized = True
     # -------------------------------------------------------------
     def get_constraints(self) -> dict[str,tuple[float,float]]:
         '''
@@ -75,8 +105,23 @@ class ConstraintReader:
         Key  : Name of fitting parameter
         Value: Tuple with mu and error
         '''
-        self._add_signal_constraints()
-        self._add_prec_constraints()
+        self._initialize()
 
         return self._d_const
+    # -------------------------------------------------------------
+    def get_covariance(self) -> tuple[list[str],numpy.ndarray]:
+        '''
+        Returns names of constrained parameters, in the order of `get_constraints`, and their covariance matrix.
+        Parameters calculated together, e.g. the PRec scales, which share inputs, are correlated.
+        '''
+        self._initialize()
+
+        l_name  = list(self._d_const)
+        arr_err = numpy.array([ err for _, err in self._d_const.values() ])
+        cov     = numpy.diag(arr_err ** 2)
+        for l_par, cov_par in self._l_block:
+            arr_ind = numpy.array([ l_name.index(par) for par in l_par ])
+            cov[numpy.ix_(arr_ind, arr_ind)] = cov_par
+
+        return l_name, cov
 # -------------------------------------------------------------
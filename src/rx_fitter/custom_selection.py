@@ -0,0 +1,47 @@
+'''
+Module with functions used to read the custom selection of rx_selection, i.e. the cuts set with `set_custom_selection`
+
+- The selection is read, not tracked, thus changes made in any way are seen
+- If rx_selection does not expose it, a warning is shown once and the selection is treated as unknown
+'''
+import copy
+import json
+import functools
+from typing import Union
+
+from dmu.logging.log_store import LogStore
+from rx_selection          import selection as sel
+
+log=LogStore.add_logger('rx_fitter:custom_selection')
+#---------------------------
+@functools.cache
+def _is_readable() -> bool:
+    '''
+    Returns True if rx_selection exposes the custom selection
+    '''
+    if hasattr(getattr(sel, 'Data', None), 'd_custom_selection'):
+        return True
+
+    log.warning('Cannot find custom selection in rx_selection, changes to it cannot be followed')
+
+    return False
+#---------------------------
+def get_custom_selection() -> Union[dict[str,str],None]:
+    '''
+    Returns copy of custom selection, None if it is not set or cannot be read
+    '''
+    if not _is_readable():
+        return None
+
+    return copy.deepcopy(sel.Data.d_custom_selection)
+#---------------------------
+def get_key() -> Union[str,None]:
+    '''
+    Returns string made from the content of the custom selection, such that it can be used to memoize
+    quantities depending on it. 'null' if it is not set, None if it cannot be read.
+    '''
+    if not _is_readable():
+        return None
+
+    return json.dumps(sel.Data.d_custom_selection, sort_keys=True)
+#---------------------------
@@ -0,0 +1,164 @@
+'''
+Module with EfficiencyStore class
+'''
+import os
+import itertools
+import multiprocessing
+from contextlib import contextmanager
+
+import yaml
+import pandas as pnd
+
+from dmu.generic                           import hashing
+from dmu.logging.log_store                 import LogStore
+from rx_selection                          import selection  as sel
+from rx_efficiencies.decay_names           import DecayNames as dn
+from rx_efficiencies.efficiency_calculator import EfficiencyCalculator
+from rx_fitter                             import loader_cache as ldc
+from rx_fitter                             import custom_selection as csl
+from rx_fitter.cache_manager               import CacheManager
+
+log=LogStore.add_logger('rx_fitter:efficiency_store')
+#---------------------------
+class EfficiencyStore:
+    '''
+    Class used to manage the directory where the efficiencies of the PRec processes are stored.
+
+    - The directory can be set with the RXFITTER_EFFICIENCY_DIR environment variable, or with `apply_setting`,
+      by default it is the `efficiencies` directory in the root of the CacheManager, where it is not pruned
+    - The efficiencies are stored by q2 bin and hash of the selection, i.e. one file for each working point
+    - The files are written atomically and the jobs needing the same file wait for the first one to make it
+    - `precompute` fills the store for several q2 bins and working points in parallel
+    '''
+    root    = os.environ.get('RXFITTER_EFFICIENCY_DIR') # If None, will follow the root of the CacheManager
+    trigger = 'Hlt2RD_BuToKpEE_MVA'
+    signal  = 'bpkpee' # Used to pick the selection, the truth matching cut, which depends on the process, is dropped
+    #---------------------------
+    @staticmethod
+    def get_hash(q2bin : str) -> str:
+        '''
+        Returns hash of selection in given q2 bin, including custom selection, if any
+        '''
+        process = dn.sample_from_decay(EfficiencyStore.signal)
+        d_sel   = sel.selection(trigger=EfficiencyStore.trigger, q2bin=q2bin, process=process)
+        d_sel   = { name : expr for name, expr in d_sel.items() if name != 'truth' }
+
+        return hashing.hash_object([q2bin, d_sel])
+    #---------------------------
+    @staticmethod
+    def get_root() -> str:
+        '''
+        Returns directory where the efficiencies are stored
+        '''
+        if EfficiencyStore.root is not None:
+            return EfficiencyStore.root
+
+        return f'{CacheManager.root}/efficiencies'
+    #---------------------------
+    @staticmethod
+    def get_path(q2bin : str) -> str:
+        '''
+        Returns path to YAML file with efficiencies for the current selection
+        '''
+        hsh = EfficiencyStore.get_hash(q2bin)
+
+        return f'{EfficiencyStore.get_root()}/{q2bin}/{hsh}/data.yaml'
+    #---------------------------
+    @staticmethod
+    def _calculate(q2bin : str, yaml_path : str) -> None:
+        log.info(f'Calculating efficiencies for {q2bin} bin')
+        obj         = EfficiencyCalculator(q2bin=q2bin)
+        obj.out_dir = os.path.dirname(yaml_path)
+        df          = obj.get_stats()
+        d_data      = df.to_dict()
+
+        with CacheManager.atomic_path(yaml_path) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as ofile:
+                yaml.safe_dump(d_data, ofile)
+    #---------------------------
+    @staticmethod
+    def make(q2bin : str) -> str:
+        '''
+        Calculates efficiencies for the current selection, if not already stored, returns path to file
+        '''
+        yaml_path = EfficiencyStore.get_path(q2bin)
+        with CacheManager.lock(yaml_path):
+            if os.path.isfile(yaml_path):
+                log.debug(f'Efficiencies found in: {yaml_path}')
+            else:
+                log.warning(f'Efficiencies not found, calculating them, use EfficiencyStore.precompute to avoid this: {yaml_path}')
+                EfficiencyStore._calculate(q2bin, yaml_path)
+
+        return yaml_path
+    #---------------------------
+    @staticmethod
+    def load(q2bin : str) -> pnd.DataFrame:
+        '''
+        Returns dataframe with efficiencies for the current selection, they are calculated if not found
+        '''
+        yaml_path = EfficiencyStore.make(q2bin)
+        data      = ldc.load_yaml(yaml_path)
+
+        return pnd.DataFrame(data)
+    #---------------------------
+    @staticmethod
+    def _make_with_selection(q2bin : str, d_cut : dict[str,str], root : str) -> str:
+        '''
+        Used by the worker processes of `precompute`
+        '''
+        EfficiencyStore.root = root
+        sel.reset_custom_selection()
+        if len(d_cut) > 0:
+            sel.set_custom_selection(d_cut=d_cut)
+
+        return EfficiencyStore.make(q2bin)
+    #---------------------------
+    @staticmethod
+    def precompute(q2bins : list[str], selections : list[dict[str,str]], nproc : int = 4) -> list[str]:
+        '''
+        Calculates efficiencies for every q2 bin and working point, in parallel processes
+
+        q2bins    : List of q2 bins, e.g. ['low', 'central', 'high']
+        selections: List of custom selections, one for each working point, e.g. [{'bdt' : 'mva_cmb > 0.8'}], {} for the default one
+        nproc     : Number of processes, with 1, the efficiencies are calculated in this process and the custom selection is restored at the end
+
+        Returns list of paths to files with efficiencies
+        '''
+        l_arg = [ (q2bin, d_cut, EfficiencyStore.get_root()) for q2bin, d_cut in itertools.product(q2bins, selections) ]
+        log.info(f'Calculating {len(l_arg)} sets of efficiencies with {nproc} processes')
+
+        if nproc <= 1:
+            old_cut = csl.get_custom_selection()
+            old_dir = EfficiencyStore.root
+            try:
+                l_path = [ EfficiencyStore._make_with_selection(*arg) for arg in l_arg ]
+            finally:
+                EfficiencyStore.root = old_dir
+                sel.reset_custom_selection()
+                if old_cut is not None:
+                    sel.set_custom_selection(d_cut=old_cut)
+
+            return l_path
+
+        with multiprocessing.get_context('spawn').Pool(processes=nproc) as pool:
+            l_path = pool.starmap(EfficiencyStore._make_with_selection, l_arg)
+
+        return l_path
+    #---------------------------
+    @staticmethod
+    @contextmanager
+    def apply_setting(root : str | None = None):
+        '''
+        Used to override default behaviour
+
+        root: Directory where the efficiencies will be stored, by default they follow the root of the CacheManager
+        '''
+        old_root = EfficiencyStore.root
+        try:
+            if root is not None:
+                EfficiencyStore.root = root
+
+            yield
+        finally:
+            EfficiencyStore.root = old_root
+#---------------------------
@@ -3,10 +3,19 @@ Module with Reader class
 '''
 # pylint: disable=too-many-instance-attributes, invalid-name
 
+import os
+import inspect
+
+import numpy
 import pandas as pnd
-from rx_fitter.pchain import PChain
 
-# TODO: add a logger !!!
+from dmu.generic              import hashing
+from dmu.logging.log_store    import LogStore
+from rx_fitter                import pchain
+from rx_fitter.pchain         import PChain, PChainArray
+from rx_fitter.cache_manager  import CacheManager
+
+log=LogStore.add_logger('rx_fitter:inclusive_decays_weights')
 #---------------------------
 class Reader:
     '''
@@ -205,3 +214,205 @@ class Reader:
 
         return wgt
 #---------------------------
+class ArrayReader(Reader):
+    '''
+    Class used to calculate decay weights for whole columns of inclusive decays at once.
+    The rules are the same as in Reader, applied as boolean masks
+    '''
+    def __init__(self, l1 : PChainArray, l2 : PChainArray, kp : PChainArray):
+        super().__init__(l1, l2, kp)
+
+        self._size = len(l1)
+    #---------------------------
+    def _get_jpsi_wgt(self) -> numpy.ndarray:
+        arr_wgt = numpy.ones(self._size)
+        for bid in self._l_bid:
+            flg_up = self._l1_ch.MatchUpstream(self._Ps_id, bid) | self._l2_ch.MatchUpstream(self._Ps_id, bid)
+            flg_jp = self._l1_ch.MatchMother(self._Jp_id)        | self._l2_ch.MatchMother(self._Jp_id)
+            flg_ps = self._l1_ch.MatchMother(self._Ps_id)        | self._l2_ch.MatchMother(self._Ps_id)
+
+            arr_wgt[flg_up &  flg_jp          ] = 0.958
+            arr_wgt[flg_up & ~flg_jp & flg_ps ] = 0.771
+
+        return arr_wgt
+    #---------------------------
+    def _get_brfrac_corr(self) -> numpy.ndarray:
+        arr_wgt = numpy.ones(self._size)
+
+        flg_bd  = self._l1_ch.MatchUpstream(self._Ps_id, self._Bd_id) | self._l2_ch.MatchUpstream(self._Ps_id, self._Bd_id)
+        flg_bu  = self._l1_ch.MatchUpstream(self._Ps_id, self._Bu_id) | self._l2_ch.MatchUpstream(self._Ps_id, self._Bu_id)
+
+        arr_wgt[flg_bd] = 1.17
+        arr_wgt[flg_bu] = 1.35
+
+        return arr_wgt
+    #---------------------------
+    def _either_track_has(self, pid : int) -> numpy.ndarray:
+        flg_l1 = self._l1_ch.HasInChain(pid)
+        flg_l2 = self._l2_ch.HasInChain(pid)
+        flg_kp = self._kp_ch.HasInChain(pid)
+
+        return flg_l1 | flg_l2 | flg_kp
+    #---------------------------
+    def _get_psi_over_jpsi(self) -> numpy.ndarray:
+        flg_ps = self._either_track_has(self._Ps_id)
+        flg_bu = self._either_track_has(self._Bu_id)
+        flg_bd = self._either_track_has(self._Bd_id)
+        flg_bs = self._either_track_has(self._Bs_id)
+
+        l_flg  = [flg_ps & flg_bs, flg_ps & flg_bu, flg_ps & flg_bd]
+        l_wgt  = [
+                ( 5.40E-4/ 1.0800E-3 ) / ( 0.0748/ 0.1077),
+                ( 6.19E-4/ 1.0006E-3 ) / ( 0.0729/ 0.1595),
+                ( 5.90E-4/ 1.2700E-3 ) / (0.07610/ 0.1850)]
+
+        return numpy.select(l_flg, l_wgt, default=1.0)
+    #---------------------------
+    def _get_kst_wgt(self) -> numpy.ndarray:
+        l_rule = [
+                ([self._Pi_id, self._KS_id             ], 0.5          ),
+                ([self._Kp_id, self._Ph_id, self._Bd_id], 0.5/0.9974   ),
+                ([self._Kp_id, self._Ph_id, self._Bu_id], 0.5/0.7597   ),
+                ([self._Pi_id, self._Et_id             ], 0.28/0.4     ),
+                ([self._Kp_id, self._Ks_id             ], 0.66 / 0.7993),
+                ([self._Kp_id, self._Kst_c             ], 0.33 / 0.4993),
+                ([self._Kp_id, self._K_2_1430_c        ], 0.1670/0.2485)]
+
+        arr_wgt = numpy.ones(self._size)
+        for l_dec_id, weight in l_rule:
+            flg           = self._kp_ch.MatchDecay(l_dec_id)
+            arr_wgt[flg] *= weight
+
+        return arr_wgt
+    #---------------------------
+    @staticmethod
+    def read_weights(df : pnd.DataFrame, p1 : str, p2 : str, p3 : str) -> numpy.ndarray:
+        '''
+        This method will return the BR weights for all the candidates in a dataframe,
+        it gives the same values as applying `Reader.read_weight` row by row.
+
+        Parameters
+        -------------------
+        df: Pandas dataframe holding PDG id information for the three particles.
+        pX: Name of particle in dataframe, e.g. L1, L2, H
+
+        Returns
+        -------------------
+        arr_wgt (numpy.ndarray): Array of weights, one for each candidate
+        '''
+        p1_ch = PChainArray.from_df(df, p1)
+        p2_ch = PChainArray.from_df(df, p2)
+        p3_ch = PChainArray.from_df(df, p3)
+
+        obj     = ArrayReader(p1_ch, p2_ch, p3_ch)
+        arr_wgt = obj.get_weight()
+
+        return arr_wgt
+#---------------------------
+class WeightTable:
+    '''
+    Class used to attach decay weights to dataframe of inclusive decays, through a table of decay topologies:
+
+    - The weights are calculated once for each distinct set of L1, L2 and H decay chains
+    - The table is cached on disk, keyed by a hash of the weighting rules
+    '''
+    _d_table : dict[str,dict[tuple,float]] = {} # Tables already loaded in this process, keyed by rules hash
+    #---------------------------
+    def __init__(self, df : pnd.DataFrame, particles : list[str]):
+        '''
+        df       : Dataframe with the ID columns
+        particles: Names of particles in dataframe, e.g. ['L1', 'L2', 'H']
+        '''
+        self._df          = df
+        self._l_particle  = particles
+        self._l_column    = WeightTable.get_columns(particles)
+        self._rules_hash  = WeightTable._get_rules_hash()
+    #---------------------------
+    @staticmethod
+    def get_columns(particles : list[str]) -> list[str]:
+        '''
+        Returns names of columns needed to calculate the weights, e.g. L1_TRUEID
+        '''
+        return [ f'{name}_{kind}' for name in particles for kind in ['TRUEID', 'MC_MOTHER_ID', 'MC_GD_MOTHER_ID', 'MC_GD_GD_MOTHER_ID'] ]
+    #---------------------------
+    @staticmethod
+    def _get_rules_hash() -> str:
+        '''
+        Returns hash of code defining the weights, any change in the rules will invalidate the cache
+        '''
+        l_source = [inspect.getsource(obj) for obj in [pchain, Reader, ArrayReader]]
+
+        return hashing.hash_object(l_source)
+    #---------------------------
+    def _get_path(self) -> str:
+        return CacheManager.get_path(kind='decay_weights', name=f'table_{self._rules_hash}.npz')
+    #---------------------------
+    def _get_table(self) -> dict[tuple,float]:
+        if self._rules_hash in WeightTable._d_table:
+            return WeightTable._d_table[self._rules_hash]
+
+        table_path = self._get_path()
+        d_table    = self._read_table(table_path) if CacheManager.is_cached(table_path) else {}
+
+        WeightTable._d_table[self._rules_hash] = d_table
+
+        return d_table
+    #---------------------------
+    def _read_table(self, table_path : str) -> dict[tuple,float]:
+        log.debug(f'Loading table of decay weights from: {table_path}')
+        data    = numpy.load(table_path)
+        l_key   = [ tuple(row) for row in data['topology'].tolist() ]
+
+        return dict(zip(l_key, data['weight'].tolist()))
+    #---------------------------
+    def _save_table(self, d_table : dict[tuple,float]) -> None:
+        table_path = self._get_path()
+        with CacheManager.lock(table_path):
+            # Other jobs might have added topologies in the meantime
+            if os.path.isfile(table_path):
+                d_table.update(self._read_table(table_path))
+
+            log.debug(f'Saving table of decay weights with {len(d_table)} topologies to: {table_path}')
+            arr_top = numpy.array(list(d_table.keys()  ), dtype='int64').reshape(-1, len(self._l_column))
+            arr_wgt = numpy.array(list(d_table.values()), dtype='float64')
+
+            with CacheManager.atomic_path(table_path) as tmp_path:
+                numpy.savez(tmp_path, topology=arr_top, weight=arr_wgt)
+
+        CacheManager.stored(table_path)
+    #---------------------------
+    def _update_table(self, d_table : dict[tuple,float], l_key : list[tuple]) -> None:
+        l_missing = [ key for key in l_key if key not in d_table ]
+        if len(l_missing) == 0:
+            log.debug('All decay topologies found in table')
+            return
+
+        log.debug(f'Calculating weights for {len(l_missing)} new decay topologies')
+        df_miss = pnd.DataFrame(l_missing, columns=self._l_column)
+        arr_wgt = ArrayReader.read_weights(df_miss, *self._l_particle)
+
+        d_table.update(zip(l_missing, arr_wgt.tolist()))
+        self._save_table(d_table)
+    #---------------------------
+    def get_weights(self) -> numpy.ndarray:
+        '''
+        Returns:
+
+        Array with decay weights, one for each candidate
+        '''
+        arr_id           = self._df[self._l_column].to_numpy(dtype='int64')
+        arr_id           = numpy.ascontiguousarray(arr_id)
+        # Each row is viewed as a single opaque value, unique over 1D arrays is much faster than with axis=0
+        arr_row          = arr_id.view(numpy.dtype((numpy.void, arr_id.itemsize * len(self._l_column)))).reshape(-1)
+        arr_top, arr_inv = numpy.unique(arr_row, return_inverse=True)
+        arr_top          = arr_top.view('int64').reshape(-1, len(self._l_column))
+        l_key            = [ tuple(row) for row in arr_top.tolist() ]
+        log.debug(f'Found {len(l_key)} decay topologies for {len(arr_id)} candidates')
+
+        d_table          = self._get_table()
+        self._update_table(d_table, l_key)
+
+        arr_wgt          = numpy.array([ d_table[key] for key in l_key ], dtype='float64')
+
+        return arr_wgt[arr_inv.reshape(-1)]
+#---------------------------
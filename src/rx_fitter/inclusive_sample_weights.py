@@ -5,6 +5,7 @@ Module with Reader class used to read weights to normalize between inclusive sam
 import os
 from functools import lru_cache
 
+import numpy
 import pandas    as pnd
 from dmu.logging.log_store import LogStore
 from rx_fitter             import pdg_utils as pu
@@ -15,18 +16,27 @@ class Reader:
     '''
     Class used to add weights that normalize inclusive samples
     '''
+    # Per-process factors are cached at class level, they are shared by all instances
+    # and, unlike caches on bound methods, they do not keep instances and their dataframes alive
+    _fu      = 0.408
+    _fs      = 0.100
+
+    _bu_proc = 'Bu_JpsiX_ee_eq_JpsiInAcc'
+    _bd_proc = 'Bd_JpsiX_ee_eq_JpsiInAcc'
+    _bs_proc = 'Bs_JpsiX_ee_eq_JpsiInAcc'
+
+    # Process -> (PDG decay, branching fraction in decay file)
+    _d_decay = {
+            _bu_proc : ('B+ --> J/psi(1S) K+'       , 0.1596),
+            _bd_proc : ('B0 --> J/psi(1S) K0'       , 0.1920),
+            _bs_proc : ('B_s()0 --> J/psi(1S) phi'  , 0.1077)}
     #---------------------------
     def __init__(self, df : pnd.DataFrame):
-        self._df      = df
-        self._fu      = 0.408
-        self._fs      = 0.100
-
-        self._bu_proc = 'Bu_JpsiX_ee_eq_JpsiInAcc'
-        self._bd_proc = 'Bd_JpsiX_ee_eq_JpsiInAcc'
-        self._bs_proc = 'Bs_JpsiX_ee_eq_JpsiInAcc'
+        self._df = df
     #---------------------------
+    @classmethod
     @lru_cache(maxsize=10)
-    def _get_br_wgt(self, proc : str) -> float:
+    def _get_br_wgt(cls, proc : str) -> float:
         '''
         Will return ratio:
 
@@ -44,29 +54,35 @@ class Reader:
         #0.1077  MyJ/psi    Myphi        PVV_CPLH 0.02 1 Hp pHp Hz pHz Hm pHm;
         #--------------------------------------------
 
-        if proc == self._bu_proc:
-            return pu.get_bf('B+ --> J/psi(1S) K+') / 0.1596
+        if proc not in cls._d_decay:
+            raise ValueError(f'Invalid process {proc}')
 
-        if proc == self._bd_proc:
-            return pu.get_bf('B0 --> J/psi(1S) K0') / 0.1920
+        decay, dec_bf = cls._d_decay[proc]
 
-        if proc == self._bs_proc:
-            return pu.get_bf('B_s()0 --> J/psi(1S) phi') / 0.1077
+        return pu.get_bf(decay) / dec_bf
+    #---------------------------
+    @classmethod
+    def prefetch(cls) -> None:
+        '''
+        Will read all the branching fractions needed from the PDG database, if they are not cached already
+        '''
+        l_decay = [ decay for decay, _ in cls._d_decay.values() ]
 
-        raise ValueError(f'Invalid process {proc}')
+        pu.prefetch(decays=l_decay)
     #---------------------------
+    @classmethod
     @lru_cache(maxsize=10)
-    def _get_hd_wgt(self, proc : str) -> float:
+    def _get_hd_wgt(cls, proc : str) -> float:
         '''
         Will return hadronization fractions used as weights
         '''
         log.info(f'Getting hadronization weights for sample {proc}')
 
-        if proc in [self._bu_proc, self._bd_proc]:
-            return self._fu
+        if proc in [cls._bu_proc, cls._bd_proc]:
+            return cls._fu
 
-        if proc == self._bs_proc:
-            return self._fs
+        if proc == cls._bs_proc:
+            return cls._fs
 
         raise ValueError(f'Invalid process: {proc}')
     #---------------------------
@@ -87,14 +103,16 @@ class Reader:
 
         return True
     #---------------------------
+    @classmethod
     @lru_cache(maxsize=10)
-    def _get_st_wgt(self, proc : str) -> float:
+    def _get_st_wgt(cls, proc : str) -> float:
         return 1
     #---------------------------
-    def _get_weight(self, row : pnd.Series) -> float:
-        w1 = self._get_st_wgt(row.proc)
-        w2 = self._get_hd_wgt(row.proc)
-        w3 = self._get_br_wgt(row.proc)
+    @classmethod
+    def _get_weight(cls, proc : str) -> float:
+        w1 = cls._get_st_wgt(proc)
+        w2 = cls._get_hd_wgt(proc)
+        w3 = cls._get_br_wgt(proc)
 
         return w1 * w2 * w3
     #---------------------------
@@ -104,7 +122,11 @@ class Reader:
 
         Pandas series with sample weights
         '''
-        sr_wgt = self._df.apply(self._get_weight, axis=1)
+        cat_proc = pnd.Categorical(self._df.proc)
+        arr_wgt  = numpy.array([ self._get_weight(proc) for proc in cat_proc.categories ], dtype='float64')
+        arr_wgt  = arr_wgt[cat_proc.codes]
+
+        sr_wgt   = pnd.Series(arr_wgt, index=self._df.index)
 
         return sr_wgt
 #---------------------------
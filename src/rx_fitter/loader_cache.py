@@ -0,0 +1,146 @@
+'''
+Module with functions used to read files and discover versions, memoized for the whole process.
+
+- The parsed content is keyed by the resolved path, modification time and size of the file, or directory,
+  thus the entries are invalidated when the file changes or when a new version directory appears
+- The paths matching wildcards are invalidated when any of the directories that can contain them changes
+- The functions are thread safe and return copies, which callers can modify
+'''
+import os
+import copy
+import glob as gb
+import json
+import threading
+from typing import Any, Callable, Union
+
+import yaml
+from dmu.generic           import version_management as vman
+from dmu.logging.log_store import LogStore
+
+log=LogStore.add_logger('rx_fitter:loader_cache')
+
+_lock   = threading.Lock()
+_d_data : dict[tuple[str,str],tuple[int,int,Any]] = {} # (kind, path) -> (modification time, size, content)
+_d_glob : dict[str,tuple[list[str],list[int],list[str]]] = {} # wildcard -> (directories, modification times, matching paths)
+#---------------------------
+def _load(kind : str, path : str, loader : Callable[[str],Any]) -> Any:
+    '''
+    Returns content of path, from memory if the path did not change since it was loaded
+
+    kind  : Kind of content, e.g. yaml, used to tell apart different contents associated to the same path
+    path  : Path to file or directory
+    loader: Function taking the path and returning the content
+    '''
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    key  = kind, path
+
+    with _lock:
+        if key in _d_data:
+            mtime, size, content = _d_data[key]
+            if (mtime, size) == (stat.st_mtime_ns, stat.st_size):
+                log.debug(f'Using {kind} in memory for: {path}')
+                return copy.deepcopy(content)
+
+    log.debug(f'Loading {kind} from: {path}')
+    content = loader(path)
+
+    with _lock:
+        _d_data[key] = stat.st_mtime_ns, stat.st_size, content
+
+    return copy.deepcopy(content)
+#---------------------------
+def _read_yaml(path : str) -> Any:
+    with open(path, encoding='utf-8') as ifile:
+        return yaml.safe_load(ifile)
+#---------------------------
+def _read_json(path : str) -> Any:
+    with open(path, encoding='utf-8') as ifile:
+        return json.load(ifile)
+#---------------------------
+def load_yaml(path : str) -> Any:
+    '''
+    Returns content of YAML file
+    '''
+    return _load('yaml', path, _read_yaml)
+#---------------------------
+def load_json(path : str) -> Any:
+    '''
+    Returns content of JSON file
+    '''
+    return _load('json', path, _read_json)
+#---------------------------
+def get_last_version(dir_path : str, **kwargs) -> str:
+    '''
+    Returns the output of `get_last_version` from dmu for the directory with versions,
+    recalculated only when a version is added or removed
+
+    dir_path: Directory with versions, e.g. v1, v2...
+    kwargs  : Arguments taken by dmu's `get_last_version`, e.g. version_only
+    '''
+    dir_path = str(dir_path)
+    kind     = 'version_' + json.dumps(kwargs, sort_keys=True)
+
+    return _load(kind, dir_path, lambda path : vman.get_last_version(dir_path=path, **kwargs))
+#---------------------------
+def _get_glob_dirs(pattern : str) -> list[str]:
+    '''
+    Returns directories whose contents decide what matches the wildcard, e.g. for /a/b/*/c.json,
+    /a/b and every directory matching /a/b/*
+    '''
+    l_part   = pattern.split('/')
+    l_magic  = [ index for index, part in enumerate(l_part) if gb.has_magic(part) ]
+    first    = l_magic[0] if len(l_magic) > 0 else len(l_part) - 1
+
+    dir_path = '/'.join(l_part[:first])
+    dir_path = dir_path or ('/' if pattern.startswith('/') else '.')
+    l_dir    = [dir_path]
+    for index in range(first + 1, len(l_part)):
+        l_dir += [ path for path in sorted(gb.glob('/'.join(l_part[:index]))) if os.path.isdir(path) ]
+
+    return l_dir
+#---------------------------
+def _get_mtimes(l_dir : list[str]) -> Union[list[int],None]:
+    '''
+    Returns modification times of directories, None if any of them was removed
+    '''
+    try:
+        return [ os.stat(dir_path).st_mtime_ns for dir_path in l_dir ]
+    except FileNotFoundError:
+        return None
+#---------------------------
+def glob(pattern : str) -> list[str]:
+    '''
+    Returns sorted list of paths matching wildcard, recalculated only when any of the directories
+    that can contain them changes, e.g. for /a/b/*/c.json, /a/b or any of its subdirectories.
+    Empty results, and the ones of recursive wildcards, are not kept.
+    '''
+    with _lock:
+        entry = _d_glob.get(pattern)
+
+    if entry is not None:
+        l_dir, l_mtime, l_path = entry
+        if _get_mtimes(l_dir) == l_mtime:
+            log.debug(f'Using paths in memory for: {pattern}')
+            return list(l_path)
+
+    # Modification times are taken first, such that changes made while searching invalidate the result
+    l_dir   = _get_glob_dirs(pattern)
+    l_mtime = _get_mtimes(l_dir)
+    l_path  = sorted(gb.glob(pattern))
+    if len(l_path) == 0 or l_mtime is None or '**' in pattern:
+        return l_path
+
+    with _lock:
+        _d_glob[pattern] = l_dir, l_mtime, l_path
+
+    return list(l_path)
+#---------------------------
+def clear() -> None:
+    '''
+    Removes everything from memory
+    '''
+    with _lock:
+        _d_data.clear()
+        _d_glob.clear()
+#---------------------------
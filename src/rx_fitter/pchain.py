@@ -1,9 +1,12 @@
 '''
-Module holding PChain class
+Module holding PChain and PChainArray classes
 '''
 # pylint: disable=invalid-name
 # pylint: disable=missing-function-docstring
 
+import numpy
+import pandas as pnd
+
 # TODO: Add a logger!!!
 #----------------------------------
 class PChain:
@@ -76,3 +79,93 @@ class PChain:
     def MatchGGMother(self, iD):
         return self._GGMOTHER_TID == abs(iD)
 #----------------------------------------------------
+class PChainArray:
+    '''
+    Class meant to represent the decay chains of many candidates, as arrays.
+    The predicates return boolean arrays with one entry per candidate.
+    '''
+    #----------------------------------
+    def __init__(self, pid, mid, gmid, ggmid):
+        self._TID          = numpy.asarray(pid)
+        self._MOTHER_TID   = numpy.asarray(mid)
+        self._GMOTHER_TID  = numpy.asarray(gmid)
+        self._GGMOTHER_TID = numpy.asarray(ggmid)
+
+        s_size = { arr.shape for arr in [self._TID, self._MOTHER_TID, self._GMOTHER_TID, self._GGMOTHER_TID] }
+        if len(s_size) != 1:
+            raise ValueError(f'Arrays of IDs have different shapes: {s_size}')
+    #----------------------------------
+    @classmethod
+    def from_df(cls, df : pnd.DataFrame, name : str) -> 'PChainArray':
+        '''
+        Will build chains from the {name}_TRUEID, {name}_MC_MOTHER_ID, etc columns of a dataframe
+        '''
+        arr_v1 = df[f'{name}_TRUEID'            ].to_numpy()
+        arr_v2 = df[f'{name}_MC_MOTHER_ID'      ].to_numpy()
+        arr_v3 = df[f'{name}_MC_GD_MOTHER_ID'   ].to_numpy()
+        arr_v4 = df[f'{name}_MC_GD_GD_MOTHER_ID'].to_numpy()
+
+        return cls(arr_v1, arr_v2, arr_v3, arr_v4)
+    #----------------------------------
+    def __len__(self) -> int:
+        return len(self._TID)
+
+    def __getitem__(self, index : int) -> PChain:
+        return PChain(
+                self._TID[index].item(),
+                self._MOTHER_TID[index].item(),
+                self._GMOTHER_TID[index].item(),
+                self._GGMOTHER_TID[index].item())
+    #----------------------------------
+    def ID(self):
+        return self._TID
+
+    def MID(self):
+        return self._MOTHER_TID
+
+    def GMID(self):
+        return self._GMOTHER_TID
+
+    def GGMID(self):
+        return self._GGMOTHER_TID
+    #----------------------------------------------------
+    def MatchDecay(self, l_dec_id):
+        if len(l_dec_id) == 1:
+            return self._TID == l_dec_id[0]
+
+        if len(l_dec_id) > 4:
+            return numpy.zeros(len(self), dtype=bool)
+
+        l_arr = [self._TID, self._MOTHER_TID, self._GMOTHER_TID, self._GGMOTHER_TID]
+        flg   = numpy.ones(len(self), dtype=bool)
+        for arr_id, dec_id in zip(l_arr, l_dec_id):
+            flg &= arr_id == abs(dec_id)
+
+        return flg
+    #----------------------------------------------------
+    def HasInChain(self, ID):
+        flg_1 = self._MOTHER_TID   == ID
+        flg_2 = self._GMOTHER_TID  == ID
+        flg_3 = self._GGMOTHER_TID == ID
+
+        return flg_1 | flg_2 | flg_3
+    #----------------------------------------------------
+    def MatchUpstream(self, IDFirstDau, HeadPart):
+        flg_1 = (self._MOTHER_TID  == IDFirstDau) & (self._GMOTHER_TID  == HeadPart)
+        flg_2 = (self._GMOTHER_TID == IDFirstDau) & (self._GGMOTHER_TID == HeadPart)
+        flg_3 =  self._GGMOTHER_TID == IDFirstDau
+
+        return flg_1 | flg_2 | flg_3
+    #----------------------------------------------------
+    def MatchID(self, iD):
+        return self._TID == abs(iD)
+
+    def MatchMother(self, iD):
+        return self._MOTHER_TID == abs(iD)
+
+    def MatchGMother(self, iD):
+        return self._GMOTHER_TID == abs(iD)
+
+    def MatchGGMother(self, iD):
+        return self._GGMOTHER_TID == abs(iD)
+#----------------------------------------------------
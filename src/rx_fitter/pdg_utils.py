@@ -1,18 +1,80 @@
 '''
 Module with functions intended to interface with the PDG API
+
+The branching fractions are cached:
+
+- In memory, for the duration of the process
+- On disk, in a JSON file keyed by the version of the PDG API and the decay
 '''
 
+import os
+import json
+from importlib.metadata import version
+
 import pdg
 
 from dmu.logging.log_store import LogStore
+from rx_fitter.cache_manager import CacheManager
 
 log=LogStore.add_logger('scripts:pdg_utils')
 #-------------------------------------------------------
-def get_bf(decay : str) -> float:
+class Data:
     '''
-    Returns branching fraction for a given decay
+    Data class
     '''
-    api    = pdg.connect()
+    cache_path : str | None = None # If None, the file is in the pdg directory of the CacheManager
+    d_bf       : dict[str,float] | None = None # Branching fractions already read in this process
+#-------------------------------------------------------
+def _get_cache_path() -> str:
+    if Data.cache_path is not None:
+        return Data.cache_path
+
+    return CacheManager.get_path(kind='pdg', name='branching_fractions.json')
+#-------------------------------------------------------
+def _get_key(decay : str) -> str:
+    return f'{version("pdg")}:{decay}'
+#-------------------------------------------------------
+def _get_cache() -> dict[str,float]:
+    if Data.d_bf is not None:
+        return Data.d_bf
+
+    Data.d_bf  = {}
+    cache_path = _get_cache_path()
+    if os.path.isfile(cache_path):
+        log.debug(f'Loading branching fractions from: {cache_path}')
+        with open(cache_path, encoding='utf-8') as ifile:
+            Data.d_bf = json.load(ifile)
+
+    return Data.d_bf
+#-------------------------------------------------------
+def _save_cache(d_bf : dict[str,float]) -> None:
+    cache_path = _get_cache_path()
+    with CacheManager.lock(cache_path):
+        # Other processes might have added decays in the meantime
+        if os.path.isfile(cache_path):
+            with open(cache_path, encoding='utf-8') as ifile:
+                d_old = json.load(ifile)
+
+            d_bf = {**d_old, **d_bf}
+
+        log.debug(f'Saving branching fractions to: {cache_path}')
+        with CacheManager.atomic_path(cache_path) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as ofile:
+                json.dump(d_bf, ofile, indent=4, sort_keys=True)
+
+    CacheManager.stored(cache_path)
+#-------------------------------------------------------
+def _connect():
+    try:
+        api = pdg.connect()
+    except Exception as exc:
+        log.error('Cannot connect to the PDG database and some branching fractions are not cached')
+        log.error(f'Either install the database or add them to: {_get_cache_path()}')
+        raise RuntimeError('PDG database not available') from exc
+
+    return api
+#-------------------------------------------------------
+def _read_bf(api, decay : str) -> float:
     mother = decay.split('-->')[0].replace(' ', '')
     for bf in api.get_particle_by_name(mother).exclusive_branching_fractions():
         if bf.is_limit:
@@ -24,3 +86,33 @@ def get_bf(decay : str) -> float:
     log.error(f'Cannot find BF for decay: {decay}')
     raise ValueError('Make sure your pdg>=0.1.2')
 #-------------------------------------------------------
+def prefetch(decays : list[str]) -> None:
+    '''
+    Will read from the PDG database the branching fractions that are not already cached.
+    The database is accessed at most once per call.
+
+    decays: List of decays, e.g. ['B+ --> J/psi(1S) K+']
+    '''
+    d_bf      = _get_cache()
+    l_missing = [ decay for decay in decays if _get_key(decay) not in d_bf ]
+    if len(l_missing) == 0:
+        log.debug('All branching fractions found in cache')
+        return
+
+    log.info(f'Reading {len(l_missing)} branching fractions from PDG database')
+    api = _connect()
+    for decay in l_missing:
+        d_bf[_get_key(decay)] = _read_bf(api, decay)
+
+    _save_cache(d_bf)
+#-------------------------------------------------------
+def get_bf(decay : str) -> float:
+    '''
+    Returns branching fraction for a given decay
+    '''
+    prefetch(decays=[decay])
+
+    d_bf = _get_cache()
+
+    return d_bf[_get_key(decay)]
+#-------------------------------------------------------
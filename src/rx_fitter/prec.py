@@ -2,10 +2,14 @@
 Module containing PRec
 '''
 import os
+import re
 import copy
 import json
-from typing     import Union
-from contextlib import contextmanager
+import time
+import threading
+from typing             import Any, Union
+from contextlib         import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy
 import pandas            as pnd
@@ -20,11 +24,16 @@ from dmu.stats              import utilities as sut
 
 from zfit.core.parameter   import Parameter as zpar
 from zfit.core.basepdf     import BasePDF   as zpdf
+from zfit.core.interfaces  import ZfitSpace as zobs
 from rx_selection          import selection as sel
 from rx_data.rdf_getter    import RDFGetter
-from ROOT                  import RDataFrame
+from ROOT                  import RDataFrame, RDF, EnableImplicitMT, DisableImplicitMT, IsImplicitMTEnabled
 
-from rx_fitter.inclusive_decays_weights import Reader as inclusive_decays_weights
+from rx_fitter                          import columns as rcol
+from rx_fitter                          import custom_selection as csl
+from rx_fitter.cache_manager            import CacheManager
+from rx_fitter.template_pdf             import TemplatePDF, tabulate
+from rx_fitter.inclusive_decays_weights import WeightTable as inclusive_decays_weights
 from rx_fitter.inclusive_sample_weights import Reader as inclusive_sample_weights
 
 log=LogStore.add_logger('rx_fitter:prec')
@@ -33,7 +42,16 @@ class PRec:
     '''
     Class used to calculate the PDF associated to the partially reconstructed background
     '''
-    use_cache = True # Use cached if found
+    use_cache       = True # Use cached if found
+    cache_version   = 1    # Version of format of cached candidates, changing it will invalidate the cache
+    nthreads        = 1    # Threads used by ROOT to read the samples, with 1 multithreading is not turned on
+    template_points = 0    # If larger than zero, KDEs are tabulated in this many points and interpolated when evaluated
+    nworkers        = 1    # Threads used to build the PDFs of the truth matching categories, with 1 they are built sequentially
+
+    _d_store     : dict[tuple,tuple[pnd.DataFrame,Any]]      = {} # Data read by `preload`, with cutflow report, for each sample and q2bin
+    _d_selection : dict[tuple,tuple[dict[str,str],str]]    = {} # (trigger, q2bin, sample) -> (selection, hash), for the custom selection in `_selection_key`
+    _selection_key  : Union[str,None]                      = None
+    _selection_lock = threading.Lock()
     #-----------------------------------------------------------
     def __init__(self, samples : list[str], trig : str, q2bin : str, d_weight : dict[str,int]):
         '''
@@ -52,24 +70,32 @@ class PRec:
 
         self._name     : str
         self._df       : pnd.DataFrame
-        self._d_fstat  = {}
+        self._d_slice  : dict[str,slice] = {} # Truth matching cut -> candidates in that category, in self._df
+        self._d_ident  : dict[tuple,str] = {} # Arguments of _get_identifier -> identifier
 
         self._d_match         = self._get_match_str()
         self._l_mass          = ['B_Mass', 'B_Mass_smr', 'B_const_mass_M', 'B_const_mass_psi2S_M']
+        self._l_particle      = ['L1', 'L2', 'H'] # Particles whose decay chains are used for the decay weights
         self._min_entries     = 40 # Will not build KDE if fewer entries than this are found
+        # Backends are picked based on the effective number of entries, see _get_backend
         self._min_isj_entries = 500 #if Fewer entries than this, switch from ISJ to FFT
+        self._min_grid_entries= 100_000 # With more entries, the ISJ bandwidth optimization is slow, use binned KDE
+        self._hist_bin_width  = 5       # MeV, bin width of histogram templates
+        self._min_bin_entries = 1_000   # Use histogram template if bins would have on average more entries than this
         self._initialized     = False
+        self._init_lock       = threading.Lock() # PDFs of different categories can be built in different threads
     #-----------------------------------------------------------
     def _initialize(self):
-        if self._initialized:
-            return
+        with self._init_lock:
+            if self._initialized:
+                return
 
-        self._check_valid(self._q2bin, ['low', 'central', 'jpsi', 'psi2', 'high'], 'q2bin')
-        self._check_weights()
+            self._check_valid(self._q2bin, ['low', 'central', 'jpsi', 'psi2', 'high'], 'q2bin')
+            self._check_weights()
 
-        self._df      = self._get_df()
+            self._df      = self._get_df()
 
-        self._initialized = True
+            self._initialized = True
     #-----------------------------------------------------------
     def _get_df(self) -> pnd.DataFrame:
         '''
@@ -85,55 +111,283 @@ class PRec:
 
         arr_wgt      = df.wgt_dec.to_numpy() * df.wgt_sam.to_numpy()
         df['wgt_br'] = self._normalize_weights(arr_wgt)
+        df           = self._add_categories(df)
 
         return df
     #-----------------------------------------------------------
-    def _need_var(self, name : str) -> bool:
-        needed = False
+    def _add_categories(self, df : pnd.DataFrame) -> pnd.DataFrame:
+        '''
+        Adds `category` column with the index of the truth matching category in `_d_match`,
+        -1 for candidates not in any category. The candidates are sorted by category, such
+        that each category is a contiguous block, whose slice is stored in `_d_slice`.
+        '''
+        l_cut      = list(self._d_match.values())
+        l_mask     = [ df.eval(cut).to_numpy(dtype=bool) for cut in l_cut ]
+        arr_nmatch = numpy.sum(l_mask, axis=0)
 
-        if name.endswith('ID'):
-            needed = True
+        noverlap   = numpy.count_nonzero(arr_nmatch > 1)
+        if noverlap > 0:
+            log.warning(f'Found {noverlap} candidates in more than one category, assigning them to the first one')
 
-        if name in self._l_mass:
-            needed = True
+        nunassigned= numpy.count_nonzero(arr_nmatch == 0)
+        if nunassigned > 0:
+            log.info(f'Found {nunassigned} candidates not in any category')
 
-        if needed:
-            log.debug(f'Picking up {name}')
+        df['category'] = numpy.select(l_mask, list(range(len(l_cut))), default=-1)
+        df             = df.sort_values('category', kind='stable', ignore_index=True)
 
-        return needed
+        arr_bound      = numpy.searchsorted(df.category.to_numpy(), numpy.arange(len(l_cut) + 1))
+        self._d_slice  = { cut : slice(arr_bound[index], arr_bound[index + 1]) for index, cut in enumerate(l_cut) }
+
+        return df
     #-----------------------------------------------------------
-    def _filter_rdf(self, rdf : RDataFrame, sample : str) -> RDataFrame:
-        d_sel = sel.selection(trigger=self._trig, q2bin=self._q2bin, process=sample)
-        for name, expr in d_sel.items():
-            if name == 'mass':
-                continue
+    def _get_columns(self) -> list[str]:
+        '''
+        Returns names of columns needed to split the candidates in categories, weight them and build the PDFs
+        '''
+        s_column = set(rcol.from_expressions(list(self._d_match.values())))
+        s_column.update(self._l_mass)
+
+        if self._d_wg['dec'] == 1:
+            s_column.update(inclusive_decays_weights.get_columns(particles=self._l_particle))
 
+        return sorted(s_column)
+    #-----------------------------------------------------------
+    def _get_selection_hash(self, sample : str) -> tuple[dict[str,str],str]:
+        '''
+        Returns full selection for sample and its hash. They are needed to load the data and to make the
+        identifiers of every PDF, thus they are calculated once per process, for each trigger, q2bin and sample.
+        Only the ones for the current custom selection are kept, if it cannot be read, they are not memoized.
+        '''
+        custom = csl.get_key()
+        if custom is None:
+            d_sel = sel.selection(trigger=self._trig, q2bin=self._q2bin, process=sample)
+            return d_sel, hashing.hash_object(d_sel)
+
+        key = self._trig, self._q2bin, sample
+        with PRec._selection_lock:
+            if custom != PRec._selection_key:
+                PRec._d_selection.clear()
+                PRec._selection_key = custom
+
+            if key not in PRec._d_selection:
+                d_sel = sel.selection(trigger=self._trig, q2bin=self._q2bin, process=sample)
+                PRec._d_selection[key] = d_sel, hashing.hash_object(d_sel)
+
+            return PRec._d_selection[key]
+    #-----------------------------------------------------------
+    def _get_sample_selection(self, sample : str) -> dict[str,str]:
+        '''
+        Returns full selection for sample
+        '''
+        d_sel, _ = self._get_selection_hash(sample)
+
+        return d_sel
+    #-----------------------------------------------------------
+    def _get_selection(self, sample : str) -> dict[str,str]:
+        '''
+        Returns selection applied to sample, the mass cut is applied later, when building the PDF
+        '''
+        d_sel = self._get_sample_selection(sample)
+        d_sel = { name : expr for name, expr in d_sel.items() if name != 'mass' }
+
+        return d_sel
+    #-----------------------------------------------------------
+    def _filter_rdf(self, rdf : RDataFrame, d_sel : dict[str,str]) -> RDataFrame:
+        for name, expr in d_sel.items():
             log.debug(f'{name:<20}{expr}')
             rdf = rdf.Filter(expr, name)
 
-        rep = rdf.Report()
-        rep.Print()
-
         return rdf
     #-----------------------------------------------------------
+    @contextmanager
+    def _multithreading(self):
+        '''
+        Turns on ROOT's implicit multithreading, if requested with `nthreads` and not already on. Needs to
+        be used before the dataframes are made. It is turned off on exit, i.e. the previous state is restored.
+        '''
+        if PRec.nthreads <= 1 or IsImplicitMTEnabled():
+            yield
+            return
+
+        log.debug(f'Using {PRec.nthreads} threads')
+        EnableImplicitMT(PRec.nthreads)
+        try:
+            yield
+        finally:
+            DisableImplicitMT()
+    #-----------------------------------------------------------
+    @staticmethod
+    def _sort_candidates(df : pnd.DataFrame) -> pnd.DataFrame:
+        '''
+        With multithreading, the entries are read in an order that changes between runs and `rdfentry_`
+        is not the entry number in the chain. The candidates are sorted by the values of their columns, which
+        gives the same order in every run, such that cached candidates and bootstrap replicas are reproducible.
+        '''
+        return df.sort_values(list(df.columns), kind='stable', ignore_index=True)
+    #-----------------------------------------------------------
     def _get_samples_df(self) -> dict[str,pnd.DataFrame]:
+        '''
+        Returns dataframes for each sample, taken from the store filled by `preload`, if there, or read otherwise
+        '''
+        d_df      = {}
+        l_missing = []
+        for sample in self._l_sample:
+            df = self._df_from_store(sample)
+            if df is None:
+                l_missing.append(sample)
+            else:
+                d_df[sample] = df
+
+        if len(l_missing) > 0:
+            d_df.update(self._read_samples(l_missing))
+
+        return { sample : d_df[sample] for sample in self._l_sample }
+    #-----------------------------------------------------------
+    def _read_samples(self, l_sample : list[str]) -> dict[str,pnd.DataFrame]:
         '''
         Returns dataframes for each sample
+
+        The cutflow reports and the columns of all the samples are booked lazily
+        and read in a single, concurrent, pass over the samples
         '''
+        l_need = self._get_columns()
+        d_rep  = {}
+        d_data = {}
+        with self._multithreading():
+            for sample in l_sample:
+                d_sel = self._get_selection(sample)
+                l_col = sorted(set(l_need) | set(rcol.from_expressions(list(d_sel.values()))))
+                gtr   = RDFGetter(sample=sample, trigger=self._trig)
+                rdf   = gtr.get_rdf(columns=l_col)
+                rdf   = self._filter_rdf(rdf, d_sel)
+                s_col = { name.c_str() for name in rdf.GetColumnNames() }
+                l_var = [ name for name in l_need if name in s_col ]
+                log.debug(f'Reading columns: {l_var}')
+
+                d_rep[sample]  = rdf.Report()
+                d_data[sample] = rdf.AsNumpy(l_var, lazy=True)
+
+            RDF.RunGraphs(list(d_rep.values()))
+
         d_df = {}
-        for sample in self._l_sample:
-            gtr        = RDFGetter(sample=sample, trigger=self._trig)
-            rdf        = gtr.get_rdf()
-            rdf        = self._filter_rdf(rdf, sample)
-            l_var      = [ name.c_str() for name in rdf.GetColumnNames() if self._need_var( name.c_str() )]
-            data       = rdf.AsNumpy(l_var)
-            df         = pnd.DataFrame(data)
+        for sample in l_sample:
+            log.info(f'Cutflow for: {sample}')
+            d_rep[sample].Print()
+
+            df         = pnd.DataFrame(d_data[sample].GetValue())
+            df         = self._sort_candidates(df)
             df['proc'] = sample
 
             d_df[sample] = df
 
         return d_df
     #-----------------------------------------------------------
+    def _get_store_key(self, sample : str) -> tuple:
+        _, hsh = self._get_selection_hash(sample)
+
+        return self._trig, sample, self._q2bin, hsh, tuple(self._get_columns())
+    #-----------------------------------------------------------
+    def _df_from_store(self, sample : str) -> Union[pnd.DataFrame,None]:
+        key = self._get_store_key(sample)
+        if key not in PRec._d_store:
+            return None
+
+        df, rep = PRec._d_store[key]
+        log.info(f'Cutflow for: {sample}, in {self._q2bin} bin, taken from store')
+        rep.Print()
+
+        return df.copy()
+    #-----------------------------------------------------------
+    @staticmethod
+    def _split_selection(d_bin_sel : dict[str,dict[str,str]]) -> tuple[dict[str,str],dict[str,dict[str,str]]]:
+        '''
+        Takes dictionary mapping q2bin to selection, returns cuts common to all bins
+        and dictionary mapping q2bin to the remaining cuts
+        '''
+        l_d_sel    = list(d_bin_sel.values())
+        d_common   = { name : expr for name, expr in l_d_sel[0].items() if all(d_sel.get(name) == expr for d_sel in l_d_sel) }
+        d_specific = { q2bin : { name : expr for name, expr in d_sel.items() if name not in d_common } for q2bin, d_sel in d_bin_sel.items() }
+
+        return d_common, d_specific
+    #-----------------------------------------------------------
+    @staticmethod
+    def preload(samples : list[str], trig : str, q2bins : list[str], d_weight : dict[str,int]) -> None:
+        '''
+        Reads the samples once for several q2 bins. Only the cuts shared by all the bins are applied while
+        reading, the rest are evaluated in memory. The PRec instances made later with the same arguments and
+        selection, for any of these q2 bins, will use these data instead of reading the samples again.
+
+        Parameters
+        ------------------
+        samples : MC samples
+        trig    : HLT2 trigger
+        q2bins  : List of q2 bins, e.g. ['jpsi', 'psi2', 'central', 'high']
+        d_weight: Dictionary specifying which weights to use, e.g. {'dec' : 1, 'sam' : 1}
+        '''
+        d_prec = { q2bin : PRec(samples=samples, trig=trig, q2bin=q2bin, d_weight=d_weight) for q2bin in q2bins }
+        l_need = sorted({ column for prec in d_prec.values() for column in prec._get_columns() })
+        prec   = d_prec[q2bins[0]]
+
+        d_rep  = {}
+        d_data = {}
+        d_flag = {}
+        with prec._multithreading():
+            for sample in samples:
+                d_bin_sel            = { q2bin : prec._get_selection(sample) for q2bin, prec in d_prec.items() }
+                d_common, d_specific = PRec._split_selection(d_bin_sel)
+                log.debug(f'Cuts common to all q2 bins: {list(d_common)}')
+
+                l_expr = [ expr for d_sel in d_bin_sel.values() for expr in d_sel.values() ]
+                l_col  = sorted(set(l_need) | set(rcol.from_expressions(l_expr)))
+                gtr    = RDFGetter(sample=sample, trigger=trig)
+                rdf    = gtr.get_rdf(columns=l_col)
+                rdf    = prec._filter_rdf(rdf, d_common)
+
+                l_bin  = []
+                for q2bin, d_cut in d_specific.items():
+                    # Cutflow of each bin is booked in its own branch of the graph
+                    d_rep[(sample, q2bin)] = d_prec[q2bin]._filter_rdf(rdf, d_cut).Report()
+
+                    l_flag = []
+                    for name, expr in d_cut.items():
+                        flag = re.sub(r'\W', '_', f'pass_{q2bin}_{name}')
+                        rdf  = rdf.Define(flag, f'static_cast<bool>({expr})')
+                        l_flag.append(flag)
+
+                    d_flag[(sample, q2bin)] = l_flag
+                    l_bin.append(' && '.join(l_flag) if len(l_flag) > 0 else 'true')
+
+                rdf    = rdf.Filter(' || '.join(f'({expr})' for expr in l_bin), 'q2 bins')
+                s_col  = { name.c_str() for name in rdf.GetColumnNames() }
+                l_var  = [ name for name in l_need if name in s_col ]
+                l_var += [ flag for q2bin in q2bins for flag in d_flag[(sample, q2bin)] ]
+
+                d_data[sample] = rdf.AsNumpy(l_var, lazy=True)
+
+            RDF.RunGraphs(list(d_rep.values()))
+
+        for sample in samples:
+            df = pnd.DataFrame(d_data[sample].GetValue())
+            for q2bin, prec in d_prec.items():
+                arr_flg = df[d_flag[(sample, q2bin)]].to_numpy().all(axis=1)
+                l_var   = [ name for name in prec._get_columns() if name in df.columns ]
+                # Sorted on the same columns as when read by `_read_samples`, to get the same order
+                df_bin  = PRec._sort_candidates(df.loc[arr_flg, l_var])
+                df_bin['proc'] = sample
+
+                key                = prec._get_store_key(sample)
+                PRec._d_store[key] = df_bin, d_rep[(sample, q2bin)]
+
+                log.info(f'Stored {len(df_bin)} candidates for {sample} in {q2bin} bin')
+    #-----------------------------------------------------------
+    @staticmethod
+    def clear_store() -> None:
+        '''
+        Removes the data stored by `preload`
+        '''
+        PRec._d_store = {}
+    #-----------------------------------------------------------
     def _add_dec_weights(self, sample : str, df : pnd.DataFrame) -> pnd.DataFrame:
         if len(df) == 0:
             return df
@@ -142,7 +396,8 @@ class PRec:
 
         if   dec == 1:
             log.debug(f'Adding decay weights to: {sample}')
-            df['wgt_dec'] = df.apply(inclusive_decays_weights.read_weight, args=('L1', 'L2', 'H'), axis=1)
+            obj           = inclusive_decays_weights(df, particles=self._l_particle)
+            df['wgt_dec'] = obj.get_weights()
         elif dec == 0:
             log.warning(f'Not using decay weights in: {sample}')
             df['wgt_dec'] = 1.
@@ -303,7 +558,10 @@ class PRec:
 
         return arr_wgt
     #-----------------------------------------------------------
-    def _filter_mass(self, df : pnd.DataFrame, mass : str, obs):
+    def _filter_mass(self, df : pnd.DataFrame, mass : str, obs, d_fstat : Union[dict[str,tuple[int,int]],None] = None):
+        '''
+        Returns candidates in the observable range, d_fstat, if passed, is filled with the cutflow
+        '''
         ([[minx]], [[maxx]]) = obs.limits
 
         cut   = f'({minx} < {mass}) & ({mass} < {maxx})'
@@ -312,32 +570,48 @@ class PRec:
         df    = df.query(cut)
         fnum  = df.shape[0]
 
-        self._d_fstat[cut] = inum, fnum
+        if d_fstat is not None:
+            d_fstat[cut] = inum, fnum
 
         return df
     #-----------------------------------------------------------
-    def _filter_cut(self, cut : str) -> pnd.DataFrame:
+    def _filter_cut(self, cut : str, d_fstat : Union[dict[str,tuple[int,int]],None] = None) -> pnd.DataFrame:
+        '''
+        Returns candidates passing the cut, d_fstat, if passed, is filled with the cutflow.
+        Categories are built in parallel, thus the cutflow is kept by the caller.
+        '''
         if cut is None:
             log.debug('Not applying any cut')
             return self._df
 
         log.info(f'Applying cut: {cut}')
         inum = self._df.shape[0]
-        df   = self._df.query(cut)
+        if cut in self._d_slice:
+            df = self._df.iloc[self._d_slice[cut]]
+        else:
+            df = self._df.query(cut)
+
         fnum = df.shape[0]
 
-        self._d_fstat[cut] = inum, fnum
+        if d_fstat is not None:
+            d_fstat[cut] = inum, fnum
 
         return df
     #-----------------------------------------------------------
     def _get_identifier(self, mass : str, cut : str, **kwargs) -> str:
-        cwargs = copy.deepcopy(kwargs)
-        del cwargs['obs']
+        '''
+        Returns hash identifying the candidates of a PDF, memoized by instance
+        '''
+        cwargs = { key : val for key, val in kwargs.items() if key != 'obs' }
+        scwg   = json.dumps(cwargs, sort_keys=True)
 
-        swgt = json.dumps(self._d_wg , sort_keys=True)
-        scwg = json.dumps(cwargs     , sort_keys=True)
+        l_sel_hash = [ self._get_selection_hash(sample) for sample in self._l_sample ]
+        key        = mass, cut, scwg, tuple(hsh for _, hsh in l_sel_hash)
+        if key in self._d_ident:
+            return self._d_ident[key]
 
-        l_d_sel   = [ sel.selection(trigger=self._trig, q2bin=self._q2bin, process=sample) for sample in self._l_sample ]
+        swgt      = json.dumps(self._d_wg , sort_keys=True)
+        l_d_sel   = [ d_sel for d_sel, _ in l_sel_hash ]
         l_element = [
                 swgt,
                 self._trig,
@@ -349,21 +623,91 @@ class PRec:
                 cut]
 
         hsh  = hashing.hash_object(l_element)
+        self._d_ident[key] = hsh
 
         return hsh
     #-----------------------------------------------------------
     def _path_from_identifier(self, identifier : str) -> str:
-        dir_path = '/tmp/cache/prec'
-        os.makedirs(dir_path, exist_ok=True)
-
-        return f'{dir_path}/pdf_{identifier}.json'
+        return CacheManager.get_path(kind='prec', name=f'pdf_{identifier}_v{PRec.cache_version}.npy')
     #-----------------------------------------------------------
-    def _drop_before_saving(self, df : pnd.DataFrame) -> pnd.DataFrame:
+    def _json_path_from_identifier(self, identifier : str) -> str:
+        '''
+        Path to candidates cached with the old JSON format, only used to migrate them
+        '''
+        return CacheManager.get_path(kind='prec', name=f'pdf_{identifier}.json')
+    #-----------------------------------------------------------
+    def _df_to_array(self, df : pnd.DataFrame) -> numpy.ndarray:
+        '''
+        Returns structured array with the masses and weights, the only columns that get cached
+        '''
         l_needed = self._l_mass + ['wgt_br', 'wgt_dec', 'wgt_sam']
-        l_drop   = [ name for name in df.columns if  name not in l_needed ]
-        df       = df.drop(l_drop, axis=1)
+        l_column = [ name for name in l_needed if name in df.columns ]
+        arr_can  = numpy.empty(len(df), dtype=[ (name, 'float64') for name in l_column ])
+        for name in l_column:
+            arr_can[name] = df[name].to_numpy()
 
-        return df
+        return arr_can
+    #-----------------------------------------------------------
+    def _save_cached(self, cache_path : str, arr_can : numpy.ndarray) -> None:
+        '''
+        Saves candidates atomically, i.e. jobs reading the cache never see partially written files
+        '''
+        with CacheManager.atomic_path(cache_path) as tmp_path:
+            numpy.save(tmp_path, arr_can)
+
+        CacheManager.stored(cache_path)
+    #-----------------------------------------------------------
+    def _load_cached(self, identifier : str) -> Union[numpy.ndarray,None]:
+        '''
+        Returns memory mapped array with cached candidates, if found, otherwise None
+        Candidates cached as JSON will be moved to the current format
+        '''
+        cache_path = self._path_from_identifier(identifier)
+        if CacheManager.is_cached(cache_path):
+            log.warning(f'Cached PDF found, loading: {cache_path}')
+            return numpy.load(cache_path, mmap_mode='r')
+
+        json_path  = self._json_path_from_identifier(identifier)
+        if not os.path.isfile(json_path):
+            return None
+
+        log.warning(f'Cached PDF found in JSON format, migrating: {json_path}')
+        df      = pnd.read_json(json_path)
+        arr_can = self._df_to_array(df)
+        self._save_cached(cache_path, arr_can)
+        os.remove(json_path)
+
+        return numpy.load(cache_path, mmap_mode='r')
+    #-----------------------------------------------------------
+    def _get_candidates(self, identifier : str, mass : str, cut : str, **kwargs) -> Union[numpy.ndarray,None]:
+        '''
+        Returns structured array with the candidates used to build the PDF, either loaded
+        from the cache or calculated and cached. None if there are no candidates.
+        '''
+        arr_can = self._load_cached(identifier) if PRec.use_cache else None
+        if arr_can is not None:
+            log.debug(f'Cut: {cut}')
+            return arr_can
+
+        self._initialize()
+        if len(self._df) == 0:
+            return None
+
+        if PRec.use_cache:
+            log.info('Cached PDF not found, calculating it')
+        else:
+            log.warning('Caching turned off, recalculating PDF')
+
+        d_fstat = {}
+        df      = self._filter_cut(cut, d_fstat)
+        df      = self._filter_mass(df, mass, kwargs['obs'], d_fstat)
+        log.info(f'Using mass: {mass} for component {kwargs["name"]}')
+        self._print_cutflow(d_fstat)
+        arr_can    = self._df_to_array(df)
+        cache_path = self._path_from_identifier(identifier)
+        self._save_cached(cache_path, arr_can)
+
+        return arr_can
     #-----------------------------------------------------------
     def _get_pdf(self, mass : str, cut : str, **kwargs) -> Union[zpdf,None]:
         '''
@@ -383,63 +727,292 @@ class PRec:
         identifier = self._get_identifier(mass, cut, **kwargs)
         cache_path = self._path_from_identifier(identifier)
 
-        if os.path.isfile(cache_path) and PRec.use_cache:
-            log.warning(f'Cached PDF found, loading: {cache_path}')
-            log.debug(f'Cut: {cut}')
-            df = pnd.read_json(cache_path)
-            if len(df) == 0:
+        # Jobs needing the same PDF wait for the first one to cache it, instead of recalculating it
+        with CacheManager.lock(cache_path):
+            arr_can = self._get_candidates(identifier, mass, cut, **kwargs)
+            if arr_can is None or len(arr_can) == 0:
                 return None
-        else:
-            self._initialize()
-            if len(self._df) == 0:
+
+            nentries = len(arr_can)
+            name     = kwargs['name']
+            if nentries < self._min_entries:
+                log.warning(f'Found fewer than {self._min_entries}: {nentries}, skipping PDF {name}')
                 return None
 
-            if PRec.use_cache:
-                log.info('Cached PDF not found, calculating it')
-            else:
-                log.warning('Caching turned off, recalculating PDF')
-
-            df = self._filter_cut(cut)
-            df = self._filter_mass(df, mass, kwargs['obs'])
-            log.info(f'Using mass: {mass} for component {kwargs["name"]}')
-            self._print_cutflow()
-            df=self._drop_before_saving(df)
-            df.to_json(cache_path, indent=4)
-
-        arr_mass     = df[mass].to_numpy()
-        nentries     = len(arr_mass)
-        name         = kwargs['name']
-        if nentries < self._min_entries:
-            log.warning(f'Found fewer than {self._min_entries}: {nentries}, skipping PDF {name}')
+            pdf = self._get_shape(identifier, arr_can, mass, **kwargs)
+
+        if pdf is None:
             return None
 
-        log.info(f'Building PDF with {nentries} entries for {name}')
+        self._attach_candidates(pdf, arr_can, mass)
 
-        if nentries < self._min_isj_entries:
-            log.info('Using FFT KDE for low statistics sample')
-            pdf      = zfit.pdf.KDE1DimFFT(arr_mass, weights=df.wgt_br.to_numpy(), **kwargs)
-        else:
-            log.info('Using ISJ KDE for high statistics sample')
-            if 'bandwidth' in kwargs: # ISJ does not accept this argument
-                del kwargs['bandwidth']
+        return pdf
+    #-----------------------------------------------------------
+    @staticmethod
+    def _attach_candidates(pdf : zpdf, arr_can : numpy.ndarray, mass : str) -> None:
+        '''
+        Attaches structured array of candidates to PDF, the arrays of masses and weights are views of its fields
+        '''
+        pdf.arr_can  = arr_can
+        pdf.arr_mass = arr_can[mass]
+        pdf.arr_wgt  = arr_can['wgt_br']
+        pdf.arr_sam  = arr_can['wgt_sam']
+        pdf.arr_dec  = arr_can['wgt_dec']
+    #-----------------------------------------------------------
+    @staticmethod
+    def _merge_candidates(l_pdf : list[zpdf], mass : str) -> numpy.ndarray:
+        '''
+        Copies the candidates of each PDF into a single contiguous structured array, once,
+        and replaces the arrays attached to each PDF by views of their block in it.
+        Returns the merged array.
+        '''
+        l_arr_can = [ pdf.arr_can for pdf in l_pdf ]
+        l_name    = [ name for name in l_arr_can[0].dtype.names if all(name in arr_can.dtype.names for arr_can in l_arr_can) ]
+        arr_bound = numpy.cumsum([0] + [ len(arr_can) for arr_can in l_arr_can ])
+        arr_all   = numpy.empty(arr_bound[-1], dtype=[ (name, 'float64') for name in l_name ])
+
+        for pdf, arr_can, start, end in zip(l_pdf, l_arr_can, arr_bound[:-1], arr_bound[1:]):
+            for name in l_name:
+                arr_all[name][start:end] = arr_can[name]
+
+            PRec._attach_candidates(pdf, arr_all[start:end], mass)
+
+        return arr_all
+    #-----------------------------------------------------------
+    def _get_backend(self, arr_wgt : numpy.ndarray, obs : zobs) -> str:
+        '''
+        Returns name of method used to build the PDF, from the effective number of entries
+        and the number of bins needed to describe the shape over the observable range
+        '''
+        ([[minx]], [[maxx]]) = obs.limits
+        nbins   = (maxx - minx) / self._hist_bin_width
+        neff    = arr_wgt.sum() ** 2 / numpy.sum(arr_wgt ** 2)
+        log.debug(f'Effective entries: {neff:.0f}, bins: {nbins:.0f}')
+
+        if neff < self._min_isj_entries:
+            return 'FFT'
+
+        if neff < self._min_grid_entries:
+            return 'ISJ'
+
+        if neff < nbins * self._min_bin_entries:
+            return 'Grid'
+
+        return 'Hist'
+    #-----------------------------------------------------------
+    def _get_hist_pdf(self, arr_mass : numpy.ndarray, arr_wgt : numpy.ndarray, obs : zobs, name : str) -> TemplatePDF:
+        '''
+        Returns template made from weighted histogram, evaluated at the bin edges
+        '''
+        ([[minx]], [[maxx]]) = obs.limits
+        nbins           = max(int((maxx - minx) / self._hist_bin_width), 2)
+        arr_val, arr_ed = numpy.histogram(arr_mass, bins=nbins, range=(minx, maxx), weights=arr_wgt, density=True)
+        arr_cn          = 0.5 * (arr_ed[1:] + arr_ed[:-1])
+        arr_val         = numpy.interp(arr_ed, arr_cn, arr_val)
+
+        return TemplatePDF(obs=obs, values=arr_val, name=name)
+    #-----------------------------------------------------------
+    def _build_pdf(self, backend : str, arr_mass : numpy.ndarray, arr_wgt : numpy.ndarray, **kwargs) -> zpdf:
+        if backend == 'FFT':
+            return zfit.pdf.KDE1DimFFT(arr_mass, weights=arr_wgt, **kwargs)
 
-            pdf      = zfit.pdf.KDE1DimISJ(arr_mass, weights=df.wgt_br.to_numpy(), **kwargs)
+        if backend == 'Hist':
+            return self._get_hist_pdf(arr_mass, arr_wgt, obs=kwargs['obs'], name=kwargs['name'])
 
-        pdf.arr_mass = arr_mass
-        pdf.arr_wgt  = df.wgt_br.to_numpy()
-        pdf.arr_sam  = df.wgt_sam.to_numpy()
-        pdf.arr_dec  = df.wgt_dec.to_numpy()
+        if 'bandwidth' in kwargs and backend == 'ISJ': # ISJ does not accept this argument
+            del kwargs['bandwidth']
 
+        if backend == 'ISJ':
+            return zfit.pdf.KDE1DimISJ(arr_mass, weights=arr_wgt, **kwargs)
+
+        if backend == 'Grid':
+            return zfit.pdf.KDE1DimGrid(arr_mass, weights=arr_wgt, **kwargs)
+
+        raise ValueError(f'Invalid backend: {backend}')
+    #-----------------------------------------------------------
+    @staticmethod
+    def _get_kde_config(pdf : zpdf, backend : str) -> Union[dict[str,Any],None]:
+        '''
+        Returns dictionary with the method and the bandwidth found when building the PDF,
+        None if the PDF cannot be rebuilt exactly from them, i.e. if the bandwidth is different for
+        each candidate, or for ISJ, where the shape depends on more than the bandwidth
+        '''
+        if backend == 'Hist':
+            return {'kind' : backend}
+
+        if backend == 'ISJ':
+            log.debug('ISJ PDFs cannot be rebuilt exactly from the bandwidth, not storing it')
+            return None
+
+        try:
+            bandwidth = float(numpy.asarray(getattr(pdf, '_bandwidth', None)))
+            npoints   =   int(numpy.asarray(getattr(pdf, '_num_grid_points', None)))
+        except (TypeError, ValueError):
+            log.debug(f'Cannot store bandwidth of {backend} PDF')
+            return None
+
+        return {'kind' : backend, 'bandwidth' : bandwidth, 'num_grid_points' : npoints}
+    #-----------------------------------------------------------
+    @staticmethod
+    def _get_fixed_kwargs(d_conf : dict[str,Any], **kwargs) -> tuple[str,dict[str,Any]]:
+        '''
+        Returns method and arguments needed to rebuild a PDF with the bandwidth found previously
+        '''
+        backend = d_conf['kind']
+        if backend == 'Hist':
+            return backend, kwargs
+
+        if backend not in ['FFT', 'Grid']:
+            raise ValueError(f'Cannot rebuild {backend} PDF from cached configuration')
+
+        kwargs['bandwidth']       = d_conf['bandwidth']
+        kwargs['num_grid_points'] = d_conf['num_grid_points']
+
+        return backend, kwargs
+    #-----------------------------------------------------------
+    def _get_kde(self, arr_can : numpy.ndarray, mass : str, d_conf : Union[dict[str,Any],None] = None, **kwargs) -> Union[zpdf,None]:
+        '''
+        Returns PDF built from candidates, None if it cannot be evaluated.
+        The method used and the time needed to build and evaluate the PDF are stored in the `metadata` attribute.
+
+        d_conf: Output of `_get_kde_config` for these candidates, if passed, the bandwidth will not be calculated again
+        '''
+        arr_mass = arr_can[mass]
+        arr_wgt  = arr_can['wgt_br']
+        nentries = len(arr_mass)
+        if d_conf is None:
+            backend = self._get_backend(arr_wgt, obs=kwargs['obs'])
+        else:
+            backend, kwargs = self._get_fixed_kwargs(d_conf, **kwargs)
+
+        log.info(f'Building PDF with {nentries} entries for {kwargs["name"]}, using: {backend}')
+
+        start    = time.perf_counter()
+        pdf      = self._build_pdf(backend, arr_mass, arr_wgt, **kwargs)
         if not is_pdf_usable(pdf):
             return None
 
+        build_time = time.perf_counter() - start
+
+        # A small, fixed, number of points is enough to compare the evaluation times of the methods
+        ([[minx]], [[maxx]]) = kwargs['obs'].limits
+        arr_x      = numpy.linspace(minx, maxx, 100)
+        start      = time.perf_counter()
+        pdf.pdf(arr_x)
+        eval_time  = time.perf_counter() - start
+
+        pdf.metadata = {
+                'kind'      : backend,
+                'nentries'  : nentries,
+                'neff'      : float(arr_wgt.sum() ** 2 / numpy.sum(arr_wgt ** 2)),
+                'build_time': build_time,
+                'eval_time' : eval_time}
+
+        log.debug(f'Built in {build_time:.3f} s, evaluated in {eval_time:.3f} s')
+
+        return pdf
+    #-----------------------------------------------------------
+    def _get_shape_hash(self, identifier : Union[str,list[str]], obs : zobs) -> str:
+        '''
+        Hash of the files with cached shapes, these depend also on the observable range,
+        the number of points of the templates and the thresholds used to pick the method
+        '''
+        ([[minx]], [[maxx]]) = obs.limits
+        l_setting = [self._min_isj_entries, self._min_grid_entries, self._hist_bin_width, self._min_bin_entries]
+
+        return hashing.hash_object([identifier, float(minx), float(maxx), PRec.template_points, l_setting])
+    #-----------------------------------------------------------
+    def _shape_path_from_identifier(self, identifier : str, obs : zobs) -> str:
+        '''
+        Path to file with cached template
+        '''
+        hsh = self._get_shape_hash(identifier, obs)
+
+        return CacheManager.get_path(kind='prec', name=f'shape_{hsh}_v{PRec.cache_version}.npz')
+    #-----------------------------------------------------------
+    def _kde_path_from_identifier(self, identifier : str, obs : zobs) -> str:
+        '''
+        Path to file with method and bandwidth of cached KDE
+        '''
+        hsh = self._get_shape_hash(identifier, obs)
+
+        return CacheManager.get_path(kind='prec', name=f'kde_{hsh}_v{PRec.cache_version}.json')
+    #-----------------------------------------------------------
+    @staticmethod
+    def _save_json(path : str, data : Any) -> None:
+        with CacheManager.atomic_path(path) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as ofile:
+                json.dump(data, ofile, indent=4)
+
+        CacheManager.stored(path)
+    #-----------------------------------------------------------
+    def _get_cached_kde(self, identifier : str, arr_can : numpy.ndarray, mass : str, **kwargs) -> Union[zpdf,None]:
+        '''
+        Returns KDE for candidates. The method and bandwidth are cached, such that
+        later calls rebuild the same KDE without calculating the bandwidth again.
+        ISJ KDEs are not cached and are always built from the candidates.
+        '''
+        kde_path = self._kde_path_from_identifier(identifier, kwargs['obs'])
+        if PRec.use_cache and CacheManager.is_cached(kde_path):
+            log.info(f'Cached KDE found, loading: {kde_path}')
+            with open(kde_path, encoding='utf-8') as ifile:
+                d_conf = json.load(ifile)
+
+            # Files written by earlier versions can have ISJ configurations, these are ignored
+            if d_conf['kind'] in ['FFT', 'Grid', 'Hist']:
+                return self._get_kde(arr_can, mass, d_conf=d_conf, **kwargs)
+
+            log.info(f'Cannot rebuild {d_conf["kind"]} KDE from cached configuration, building it again')
+
+        pdf = self._get_kde(arr_can, mass, **kwargs)
+        if pdf is None:
+            return None
+
+        d_conf = self._get_kde_config(pdf, backend=pdf.metadata['kind'])
+        if d_conf is not None:
+            self._save_json(kde_path, d_conf)
+
+        return pdf
+    #-----------------------------------------------------------
+    def _get_shape(self, identifier : str, arr_can : numpy.ndarray, mass : str, **kwargs) -> Union[zpdf,None]:
+        '''
+        Returns PDF for candidates. If templates are used, their shapes are cached
+        and reloaded in later calls, without building the KDEs again. Otherwise the
+        KDEs are rebuilt with the cached bandwidths, where possible.
+        '''
+        if PRec.template_points <= 0:
+            return self._get_cached_kde(identifier, arr_can, mass, **kwargs)
+
+        obs        = kwargs['obs']
+        name       = kwargs['name']
+        shape_path = self._shape_path_from_identifier(identifier, obs)
+        if PRec.use_cache and CacheManager.is_cached(shape_path):
+            log.info(f'Cached shape found, loading: {shape_path}')
+            data         = numpy.load(shape_path)
+            pdf          = TemplatePDF(obs=obs, values=data['values'], name=name)
+            pdf.metadata = json.loads(str(data['metadata']))
+
+            return pdf
+
+        kde = self._get_kde(arr_can, mass, **kwargs)
+        if kde is None:
+            return None
+
+        pdf          = tabulate(kde, npoints=PRec.template_points)
+        pdf.metadata = {**kde.metadata, 'npoints' : PRec.template_points, 'max_error' : pdf.max_error}
+
+        with CacheManager.atomic_path(shape_path) as tmp_path:
+            numpy.savez(tmp_path, values=pdf.values, metadata=json.dumps(pdf.metadata))
+
+        CacheManager.stored(shape_path)
+
         return pdf
     #-----------------------------------------------------------
-    def _print_cutflow(self) -> None:
+    def _print_cutflow(self, d_fstat : dict[str,tuple[int,int]]) -> None:
         log.debug('-' * 50)
         log.debug(f'{"Cut":<30}{"Total":<20}{"Passed":<20}')
         log.debug('-' * 50)
-        for cut, (inum, fnum) in self._d_fstat.items():
+        for cut, (inum, fnum) in d_fstat.items():
             log.debug(f'{cut:<30}{inum:<20}{fnum:<20}')
         log.debug('-' * 50)
     #-----------------------------------------------------------
@@ -462,6 +1035,52 @@ class PRec:
 
         return par
     #-----------------------------------------------------------
+    def _get_category_pdfs(self, mass : str, **kwargs) -> dict[str,Union[zpdf,None]]:
+        '''
+        Returns dictionary mapping name of truth matching category to PDF, in the order of `_d_match`.
+        The PDFs are independent and, if requested with `nworkers`, are built in a pool of threads
+        '''
+        l_name = list(self._d_match)
+        nwork  = min(PRec.nworkers, len(l_name))
+
+        def _build(name : str) -> Union[zpdf,None]:
+            return self._get_pdf(mass, self._d_match[name], name=name, **kwargs)
+
+        if nwork <= 1:
+            return { name : _build(name) for name in l_name }
+
+        # ROOT is only used in this thread, the workers only build the PDFs
+        self._initialize()
+
+        log.debug(f'Building {len(l_name)} PDFs with {nwork} threads')
+        with ThreadPoolExecutor(max_workers=nwork) as pool:
+            l_pdf = list(pool.map(_build, l_name))
+
+        return dict(zip(l_name, l_pdf))
+    #-----------------------------------------------------------
+    def _get_fractions(self, mass : str, d_pdf : dict[str,zpdf], **kwargs) -> list[float]:
+        '''
+        Returns fractions of the categories, proportional to their total weights, cached together with the shapes
+        '''
+        if len(d_pdf) == 0:
+            return []
+
+        l_ident   = [ self._get_identifier(mass, self._d_match[name], name=name, **kwargs) for name in d_pdf ]
+        hsh       = self._get_shape_hash(l_ident, kwargs['obs'])
+        frac_path = CacheManager.get_path(kind='prec', name=f'frac_{hsh}_v{PRec.cache_version}.json')
+        if PRec.use_cache and CacheManager.is_cached(frac_path):
+            log.debug(f'Cached fractions found, loading: {frac_path}')
+            with open(frac_path, encoding='utf-8') as ifile:
+                d_frc = json.load(ifile)
+
+            return [ d_frc[name] for name in d_pdf ]
+
+        l_wgt_yld = [ float(pdf.arr_wgt.sum()) for pdf in d_pdf.values() ]
+        l_frc     = [ wgt_yld / sum(l_wgt_yld) for wgt_yld in l_wgt_yld ]
+        self._save_json(frac_path, dict(zip(d_pdf, l_frc)))
+
+        return l_frc
+    #-----------------------------------------------------------
     def get_sum(self, mass : str, name='unnamed', **kwargs) -> Union[zpdf,None]:
         '''Provides extended PDF that is the sum of multiple KDEs representing PRec background
 
@@ -477,12 +1096,11 @@ class PRec:
 
         # These cuts are not meant to override the selection, they are used to classify the fully selected data
         # into physically meaningful categories, such that they can be used later, together
-        d_pdf     = { name : self._get_pdf(mass, cut, name=name, **kwargs) for name, cut in self._d_match.items()}
-        d_pdf     = { name : pdf                                           for name, pdf in d_pdf.items() if pdf is not None}
+        d_pdf     = self._get_category_pdfs(mass, **kwargs)
+        d_pdf     = { name : pdf for name, pdf in d_pdf.items() if pdf is not None}
 
         l_pdf     = list(d_pdf.values())
-        l_wgt_yld = [ sum(pdf.arr_wgt) for pdf in l_pdf ]
-        l_frc     = [ wgt_yld / sum(l_wgt_yld) for wgt_yld in l_wgt_yld ]
+        l_frc     = self._get_fractions(mass, d_pdf, **kwargs)
         l_yld     = [ self._frac_from_pdf(pdf=pdf, frc=frc) for pdf, frc in zip(l_pdf, l_frc)]
         for yld in l_yld:
             yld.floating = False
@@ -495,18 +1113,210 @@ class PRec:
             log.warning('No PDF can be built with dataset')
             return None
 
-        l_arr_mass   = [ pdf.arr_mass for pdf in l_pdf ]
-        l_arr_wgt    = [ pdf.arr_wgt  for pdf in l_pdf ]
-        l_arr_sam    = [ pdf.arr_sam  for pdf in l_pdf ]
-        l_arr_dec    = [ pdf.arr_dec  for pdf in l_pdf ]
-
-        pdf.arr_mass = numpy.concatenate(l_arr_mass)
-        pdf.arr_wgt  = numpy.concatenate(l_arr_wgt )
-        pdf.arr_dec  = numpy.concatenate(l_arr_dec )
-        pdf.arr_sam  = numpy.concatenate(l_arr_sam )
+        # The categories hold views of blocks of the merged array, the sum holds views of the whole array
+        # A single category is returned as it is, with its own metadata
+        if len(l_pdf) >= 2:
+            arr_can      = self._merge_candidates(l_pdf, mass)
+            self._attach_candidates(pdf, arr_can, mass)
+            pdf.metadata = { name : cat_pdf.metadata for name, cat_pdf in d_pdf.items() }
 
         return pdf
     #-----------------------------------------------------------
+    def get_sums(self, masses : list[str], obs : Union[zobs,dict[str,zobs]], name='unnamed', **kwargs) -> dict[str,Union[zpdf,None]]:
+        '''
+        Provides PDFs for several mass definitions. The data is loaded, weighted and split
+        into categories once and shared by all the PDFs, which are cached separately.
+
+        Parameters:
+        masses (list): Names of masses, e.g. ['B_Mass_smr', 'B_const_mass_M']
+        obs          : Observable used for all masses, or dictionary mapping each mass to its observable
+        name (str)   : PDF name
+        **kwargs     : Arguments meant to be taken by the KDEs
+
+        Returns:
+        Dictionary mapping each mass to the output of `get_sum`
+        '''
+        d_obs = obs if isinstance(obs, dict) else { mass : obs for mass in masses }
+
+        return { mass : self.get_sum(mass=mass, name=name, obs=d_obs[mass], **kwargs) for mass in masses }
+    #-----------------------------------------------------------
+    def _get_category_candidates(self, mass : str, **kwargs) -> dict[str,numpy.ndarray]:
+        '''
+        Returns dictionary mapping truth matching category to its candidates, for the categories that `get_sum` would use
+        '''
+        d_can = {}
+        for name, cut in self._d_match.items():
+            identifier = self._get_identifier(mass, cut, name=name, **kwargs)
+            cache_path = self._path_from_identifier(identifier)
+            with CacheManager.lock(cache_path):
+                arr_can = self._get_candidates(identifier, mass, cut, name=name, **kwargs)
+
+            if arr_can is None or len(arr_can) < self._min_entries:
+                log.debug(f'Skipping category: {name}')
+                continue
+
+            d_can[name] = arr_can
+
+        return d_can
+    #-----------------------------------------------------------
+    def _get_weight_variations(
+            self,
+            d_can     : dict[str,numpy.ndarray],
+            kind      : str,
+            nvar      : int,
+            rng       : numpy.random.Generator,
+            br_errors : Union[dict[str,float],None]) -> dict[str,numpy.ndarray]:
+        '''
+        Returns dictionary mapping category to array of weights with shape (nvar, number of candidates)
+        '''
+        if kind in ['dec', 'sam']:
+            if self._d_wg[kind] != 1:
+                raise ValueError(f'Weights {kind} are not used, they cannot be switched off')
+
+            # The total weight is proportional to the product of the decay and sample weights
+            other = {'dec' : 'wgt_sam', 'sam' : 'wgt_dec'}[kind]
+
+            return { name : numpy.broadcast_to(arr_can[other], (nvar, len(arr_can))) for name, arr_can in d_can.items() }
+
+        if kind == 'bootstrap':
+            return { name : rng.poisson(1.0, size=(nvar, len(arr_can))) * arr_can['wgt_br'] for name, arr_can in d_can.items() }
+
+        if kind == 'br':
+            if br_errors is None:
+                raise ValueError('Relative errors of the categories are needed for BR variations')
+
+            # Log-normal factors, with mean 1 and standard deviation equal to the relative error, are always positive
+            d_wgt = {}
+            for name, arr_can in d_can.items():
+                sigma       = numpy.sqrt(numpy.log1p(br_errors.get(name, 0.) ** 2))
+                arr_fac     = numpy.exp(sigma * rng.standard_normal(size=(nvar, 1)) - sigma ** 2 / 2)
+                d_wgt[name] = arr_fac * arr_can['wgt_br']
+
+            return d_wgt
+
+        raise ValueError(f'Invalid kind of variation: {kind}')
+    #-----------------------------------------------------------
+    def _get_hist_variations(
+            self,
+            d_can : dict[str,numpy.ndarray],
+            d_wgt : dict[str,numpy.ndarray],
+            mass  : str,
+            obs   : zobs) -> tuple[numpy.ndarray,numpy.ndarray]:
+        '''
+        Returns bin edges and array with normalized templates, with shape (number of variations, number of bins).
+        The sum of the category templates, with fractions proportional to their total weights, is the histogram of all the candidates.
+        '''
+        ([[minx]], [[maxx]]) = obs.limits
+        nbins    = max(int((maxx - minx) / self._hist_bin_width), 2)
+        arr_ed   = numpy.linspace(minx, maxx, nbins + 1)
+
+        arr_mass = numpy.concatenate([ arr_can[mass] for arr_can in d_can.values() ])
+        arr_wgt  = numpy.concatenate(list(d_wgt.values()), axis=1)
+        nvar     = len(arr_wgt)
+
+        arr_bin  = numpy.clip(numpy.digitize(arr_mass, arr_ed) - 1, 0, nbins - 1)
+        # Bins of each variation are offset, such that a single bincount fills all the histograms
+        arr_idx  = arr_bin[None, :] + nbins * numpy.arange(nvar)[:, None]
+        arr_hist = numpy.bincount(arr_idx.ravel(), weights=arr_wgt.ravel(), minlength=nvar * nbins)
+        arr_hist = arr_hist.reshape(nvar, nbins)
+        arr_hist = arr_hist / (arr_hist.sum(axis=1, keepdims=True) * numpy.diff(arr_ed))
+
+        return arr_ed, arr_hist
+    #-----------------------------------------------------------
+    def _get_pdf_variation(
+            self,
+            index : int,
+            d_can : dict[str,numpy.ndarray],
+            d_wgt : dict[str,numpy.ndarray],
+            mass  : str,
+            name  : str,
+            **kwargs) -> Union[zpdf,None]:
+        '''
+        Returns sum of category PDFs for a given variation, the backends are the ones of the nominal weights.
+        Categories without candidates with positive weights, e.g. in bootstrap replicas, are skipped
+        '''
+        l_pdf = []
+        l_frc = []
+        for cat_name, arr_can in d_can.items():
+            arr_wgt = d_wgt[cat_name][index]
+            arr_use = arr_wgt > 0
+            if not numpy.any(arr_use):
+                log.warning(f'No candidates with positive weights for {cat_name} in variation {index}, skipping')
+                continue
+
+            backend = self._get_backend(arr_can['wgt_br'], obs=kwargs['obs'])
+            pdf     = self._build_pdf(backend, arr_can[mass][arr_use], arr_wgt[arr_use], name=f'{cat_name}_{index}', **kwargs)
+
+            l_pdf.append(pdf)
+            l_frc.append(arr_wgt.sum())
+
+        l_frc = [ frc / sum(l_frc) for frc in l_frc ]
+        if len(l_pdf) == 0:
+            log.warning(f'No PDF can be built for variation {index}')
+            return None
+
+        if len(l_pdf) == 1:
+            return l_pdf[0]
+
+        return zfit.pdf.SumPDF(l_pdf, fracs=l_frc, name=f'{name}_{index}')
+    #-----------------------------------------------------------
+    def get_variations(
+            self,
+            mass      : str,
+            kind      : str,
+            nvar      : int = 100,
+            name      : str = 'unnamed',
+            seed      : int = 42,
+            br_errors : Union[dict[str,float],None] = None,
+            binned    : bool = False,
+            **kwargs) -> Union[list[Union[zpdf,None]],tuple[numpy.ndarray,numpy.ndarray]]:
+        '''
+        Provides variations of the PDF from `get_sum`, with the same candidates and categories, but different weights.
+        The candidates are loaded once and the weights of all the variations are made in one step.
+
+        Parameters:
+        mass (str)      : Mass, as in `get_sum`
+        kind (str)      : Kind of variation:
+                            dec      : Decay weights switched off, one variation
+                            sam      : Sample weights switched off, one variation
+                            bootstrap: Poisson bootstrap replicas of the candidates
+                            br       : Yields of the categories scaled by log-normal factors, with mean 1 and widths given by their errors
+        nvar (int)      : Number of variations, used only for bootstrap and br
+        name (str)      : PDF name, the index of the variation is appended
+        seed (int)      : Seed of the random number generator
+        br_errors (dict): Maps name of truth matching category to relative error of its yield, needed for br
+        binned (bool)   : If True, will return bin edges and normalized templates, with shape (nvar, nbins)
+        **kwargs        : Arguments meant to be taken by the KDEs, e.g. obs
+
+        Returns:
+        List of PDFs, built in a pool of threads if `nworkers` > 1, or bin edges and templates if binned is True.
+        The variations for which no PDF can be built are None
+        '''
+        nvar  = 1 if kind in ['dec', 'sam'] else nvar
+        rng   = numpy.random.default_rng(seed=seed)
+        d_can = self._get_category_candidates(mass, **kwargs)
+        if len(d_can) == 0:
+            log.warning('No PDF can be built with dataset')
+            return []
+
+        d_wgt = self._get_weight_variations(d_can, kind=kind, nvar=nvar, rng=rng, br_errors=br_errors)
+        log.info(f'Made {nvar} variations of kind {kind}')
+
+        if binned:
+            return self._get_hist_variations(d_can, d_wgt, mass=mass, obs=kwargs['obs'])
+
+        def _build(index : int) -> Union[zpdf,None]:
+            return self._get_pdf_variation(index, d_can, d_wgt, mass=mass, name=name, **kwargs)
+
+        nwork = min(PRec.nworkers, nvar)
+        if nwork <= 1:
+            return [ _build(index) for index in range(nvar) ]
+
+        with ThreadPoolExecutor(max_workers=nwork) as pool:
+            l_pdf = list(pool.map(_build, range(nvar)))
+
+        return l_pdf
+    #-----------------------------------------------------------
     @staticmethod
     def plot_pdf(
             pdf     : zpdf,
@@ -570,19 +1380,47 @@ class PRec:
 
         text_path = plot_path.replace('png', 'txt')
         sut.print_pdf(pdf, txt_path=text_path)
+
+        if hasattr(pdf, 'metadata'):
+            with open(f'{out_dir}/{name}_metadata.json', 'w', encoding='utf-8') as ofile:
+                json.dump(pdf.metadata, ofile, indent=4)
     #-----------------------------------------------------------
     @staticmethod
     @contextmanager
-    def apply_setting(use_cache : bool):
+    def apply_setting(
+            use_cache       : bool | None = None,
+            nthreads        : int  | None = None,
+            template_points : int  | None = None,
+            nworkers        : int  | None = None):
         '''
         Used to override default behaviour
 
-        use_cache : If False (default is True) will recalculate the PDF
+        use_cache       : If False (default is True) will recalculate the PDF
+        nthreads        : Number of threads used by ROOT to read the samples, by default 1, i.e. no multithreading
+        template_points : If larger than zero, KDEs will be replaced by templates with this number of points
+        nworkers        : Number of threads used to build the PDFs of the truth matching categories, by default 1, i.e. no threads
         '''
         old_val = PRec.use_cache
+        old_nth = PRec.nthreads
+        old_tpl = PRec.template_points
+        old_nwk = PRec.nworkers
         try:
-            PRec.use_cache = use_cache
+            if use_cache is not None:
+                PRec.use_cache = use_cache
+
+            if nthreads is not None:
+                PRec.nthreads = nthreads
+
+            if template_points is not None:
+                PRec.template_points = template_points
+
+            if nworkers is not None:
+                PRec.nworkers = nworkers
+
             yield
         finally:
-            PRec.use_cache = old_val
+            PRec.use_cache       = old_val
+            PRec.nthreads        = old_nth
+            PRec.template_points = old_tpl
+            PRec.nworkers        = old_nwk
 #-----------------------------------------------------------
@@ -4,19 +4,19 @@ Module containing class ModelScales and helper functions
 
 import os
 import math
+from typing              import Union
 from importlib.resources import files
 
-import yaml
 import numpy
 import pandas                   as pnd
-import jacobi                   as jac
 
 from dmu.logging.log_store                 import LogStore
 from dmu.generic                           import hashing
-from dmu.generic.version_management        import get_last_version
 from rx_selection                          import selection  as sel
 from rx_efficiencies.decay_names           import DecayNames as dn
-from rx_efficiencies.efficiency_calculator import EfficiencyCalculator
+from rx_fitter                             import propagation  as prp
+from rx_fitter                             import loader_cache as ldc
+from rx_fitter.efficiency_store            import EfficiencyStore
 
 log=LogStore.add_logger('rx_fitter:prec_scales')
 #------------------------------------------
@@ -25,27 +25,25 @@ class PrecScales:
     Class used to calculate scale factor between yields of partially reconstructed component and signal
     '''
     #------------------------------------------
-    def __init__(self, proc : str, q2bin : str):
+    def __init__(self, proc : Union[str,None] = None, *, q2bin : str):
         '''
-        proc : Nickname of decay process, nicknames are in the DecayNames class
+        proc : Nickname of decay process, nicknames are in the DecayNames class, only needed by `get_scale`
         q2bin: Needed to apply correct selection to get correct efficiencies and scales
         '''
         self._proc        = proc
         self._q2bin       = q2bin
 
         self._d_frbf      : dict
-        self._df_eff      : pnd.DataFrame
+        self._d_eff       : dict[str,pnd.DataFrame] = {} # Hash of selection of process -> efficiencies
         self._trigger     = 'Hlt2RD_BuToKpEE_MVA'
         self._initialized = False
-
-        self._hash        = self._get_hash()
     #------------------------------------------
-    def _get_hash(self) -> str:
+    def _get_hash(self, proc : str) -> str:
         project = {'Hlt2RD_BuToKpEE_MVA' : 'RK'}[self._trigger]
-        process = dn.sample_from_decay(self._proc)
+        process = dn.sample_from_decay(proc)
 
         d_sel   = sel.selection(trigger=self._trigger, q2bin=self._q2bin, process=process)
-        hsh     = hashing.hash_object([self._proc, self._q2bin, d_sel])
+        hsh     = hashing.hash_object([proc, self._q2bin, d_sel])
 
         return hsh
     #------------------------------------------
@@ -61,7 +59,6 @@ class PrecScales:
 
         log.debug('Initializing')
         self._load_fractions()
-        self._load_efficiencies()
 
         self._initialized = True
     #------------------------------------------
@@ -69,80 +66,71 @@ class PrecScales:
         log.debug('Getting hadronization fractions and branching ratios')
 
         frbf_dir  = files('rx_efficiencies_data').joinpath('prec_sf')
-        frbf_path = get_last_version(dir_path=frbf_dir, version_only=False)
+        frbf_path = ldc.get_last_version(dir_path=frbf_dir, version_only=False)
         frbf_path = f'{frbf_path}/fr_bf.yaml'
 
         log.debug(f'Picking up branching fractions from: {frbf_path}')
-        with open(frbf_path, encoding='utf-8') as ifile:
-            self._d_frbf = yaml.safe_load(ifile)
-    #------------------------------------------
-    def _calculate_efficiencies(self, yaml_path : str) -> None:
-        log.debug('Efficiencies not found, calculating them')
-        out_dir     = os.path.dirname(yaml_path)
-        obj         = EfficiencyCalculator(q2bin=self._q2bin)
-        obj.out_dir = out_dir
-        df          = obj.get_stats()
-        d_data      = df.to_dict()
-        with open(yaml_path, 'w', encoding='utf-8') as ofile:
-            yaml.safe_dump(d_data, ofile)
+        self._d_frbf = ldc.load_yaml(frbf_path)
     #------------------------------------------
-    def _load_efficiencies(self):
-        log.debug('Getting efficiencies')
+    def _load_efficiencies(self, proc : str) -> pnd.DataFrame:
+        '''
+        Returns efficiencies found with the selection of a given process, they are loaded once for each selection
+
+        proc: Process whose selection is used to find the efficiencies in the data package
+        '''
+        hsh = self._get_hash(proc)
+        if hsh in self._d_eff:
+            return self._d_eff[hsh]
+
+        log.debug(f'Getting efficiencies for selection of {proc}: {hsh}')
 
         eff_dir  = files('rx_efficiencies_data').joinpath('prec_sf')
-        eff_path = get_last_version(dir_path=eff_dir, version_only=False)
-        eff_path = f'{eff_path}/efficiencies_{self._q2bin}/{self._hash}/data.yaml'
+        eff_path = ldc.get_last_version(dir_path=eff_dir, version_only=False)
+        eff_path = f'{eff_path}/efficiencies_{self._q2bin}/{hsh}/data.yaml'
 
+        # Efficiencies shipped with the data package are used if found, otherwise the ones in the store
         if not os.path.isfile(eff_path):
-            self._calculate_efficiencies(yaml_path=eff_path)
-
-        with open(eff_path, encoding='utf-8') as ifile:
-            data = yaml.safe_load(ifile)
+            df = EfficiencyStore.load(q2bin=self._q2bin)
+        else:
+            data = ldc.load_yaml(eff_path)
+            df   = pnd.DataFrame(data)
 
-        df = pnd.DataFrame(data)
+        self._d_eff[hsh] = df
 
-        self._df_eff = df
+        return df
     #------------------------------------------
-    def _get_fr(self, proc : str) -> float:
+    def _get_fr_name(self, proc : str) -> str:
         '''
-        Returns hadronization fraction for given process
+        Returns name of hadronization fraction for given process, e.g. fu
         '''
         if   proc.startswith('bp'):
-            fx = 'fu'
-        elif proc.startswith('bd'):
-            fx = 'fd'
-        elif proc.startswith('bs'):
-            fx = 'fs'
-        else:
-            raise ValueError(f'Cannot find hadronization fraction for: {proc}')
+            return 'fu'
 
-        fx = self._d_frbf['fr'][fx]
+        if proc.startswith('bd'):
+            return 'fd'
 
-        return fx
-    #------------------------------------------
-    def _mult_brs(self, l_br : list[tuple[float,float]]):
-        log.debug('Multiplying branching fractions')
+        if proc.startswith('bs'):
+            return 'fs'
 
-        l_br_val = [ float(br[0]) for br in l_br ] # These numbers come from YAML files
-        l_br_err = [ float(br[1]) for br in l_br ] # when using "e" in scientific notation, these numbers are made into strings
-        br_cov   = numpy.diag(l_br_err) ** 2
-        val, var = jac.propagate(math.prod, l_br_val, br_cov)
-        err      = math.sqrt(var)
-
-        return val, err
+        raise ValueError(f'Cannot find hadronization fraction for: {proc}')
     #------------------------------------------
-    def _get_br(self, proc : str) -> tuple[float,float]:
-        log.debug(f'Calculating BR for {proc}')
-
-        l_dec = dn.subdecays_from_decay(proc)
-        l_bf  = [ self._d_frbf['bf'][dec] for dec in l_dec ]
+    def _get_fr(self, proc : str) -> float:
+        '''
+        Returns hadronization fraction for given process
+        '''
+        fx = self._get_fr_name(proc)
+        fx = self._d_frbf['fr'][fx]
 
-        return self._mult_brs(l_bf)
+        return fx
     #------------------------------------------
-    def _get_ef(self, proc : str):
+    def _get_ef(self, proc : str, source : str):
+        '''
+        proc  : Process whose efficiency is returned
+        source: Process with whose selection the efficiencies were calculated
+        '''
         log.debug(f'Calculating efficiencies for {proc}')
 
-        df = self._df_eff
+        df = self._load_efficiencies(source)
         df = df[df.Process == proc]
 
         if len(df) != 1:
@@ -156,49 +144,122 @@ class PrecScales:
 
         return eff, err
     #------------------------------------------
-    def _print_vars(self, l_tup : list[tuple[float,float]], proc : str) -> None:
+    def _print_vars(self, l_tup : list[tuple[float,float]], l_name : list[str], proc : str) -> None:
         log.debug('')
         log.debug(f'Decay: {proc}')
         log.debug('-' * 20)
         log.debug(f'{"Var":<20}{"Value":<20}{"Error":<20}')
         log.debug('-' * 20)
-        for (val, err), name in zip(l_tup, ['fr', 'br', 'eff']):
-            log.debug(f'{name:<20}{val:<20.3e}{err:<20.3e}')
+        for (val, err), name in zip(l_tup, l_name):
+            log.debug(f'{name:<20}{float(val):<20.3e}{float(err):<20.3e}')
         log.debug('-' * 20)
     #------------------------------------------
-    def get_scale(self, signal : str) -> tuple[float,float]:
+    def _get_inputs(self, proc : str, source : str) -> dict[str,tuple[float,float]]:
         '''
-        Returns scale factor k and error, meant to be used in:
+        Returns dictionary mapping name of each independent input of the yield of a process, to its value and error, i.e.
+        hadronization fraction, branching fraction of each subdecay and efficiency
+
+        source: Process with whose selection the efficiency was calculated
+        '''
+        fr_name = self._get_fr_name(proc)
+        d_inp   = {fr_name : self._get_fr(proc)}
+        for dec in dn.subdecays_from_decay(proc):
+            d_inp[f'bf_{dec}'] = self._d_frbf['bf'][dec]
+
+        d_inp[f'eff_{proc}'] = self._get_ef(proc, source=source)
+
+        return d_inp
+    #------------------------------------------
+    def _get_exponents(
+            self,
+            procs  : list[str],
+            signal : str) -> tuple[list[str],numpy.ndarray,numpy.ndarray,dict[str,dict[str,tuple[float,float]]]]:
+        '''
+        Returns:
+
+        - Names of inputs
+        - Array with their values and errors, with shape (ninputs, 2)
+        - Array with shape (nprocs, ninputs) with the powers to which each input is raised in the scale of each process
+        - Dictionary mapping each process, and the signal, to the output of `_get_inputs`
+
+        Inputs shared between processes, e.g. fu or the signal efficiency, appear only once, such that their correlations are kept.
+        The efficiencies are taken from the files made with the selection of each process, the ones of the signal have to agree.
+        '''
+        d_inp = {}
+        d_dec = {}
+        l_exp = []
+        for proc in procs:
+            d_exp = {}
+            for sign, dec in [(+1, proc), (-1, signal)]:
+                l_dec = dn.subdecays_from_decay(dec)
+                d_cur = self._get_inputs(dec, source=proc)
+                if dec in d_dec and d_dec[dec] != d_cur:
+                    raise ValueError(f'Inputs of {dec} differ between efficiency files of {procs}: {d_dec[dec]} != {d_cur}')
+
+                d_dec[dec] = d_cur
+
+                d_inp.update(d_dec[dec])
+                for name in d_dec[dec]:
+                    # Subdecays can be repeated, e.g. two J/psi -> ee
+                    npow        = l_dec.count(name[3:]) if name.startswith('bf_') else 1
+                    d_exp[name] = d_exp.get(name, 0) + sign * npow
+
+            l_exp.append(d_exp)
+
+        l_name  = list(d_inp)
+        # These numbers come from YAML files, when using "e" in scientific notation, they are made into strings
+        arr_inp = numpy.array([ [float(val), float(err)] for val, err in d_inp.values() ])
+        arr_exp = numpy.array([ [ d_exp.get(name, 0) for name in l_name ] for d_exp in l_exp ], dtype='float64')
+
+        return l_name, arr_inp, arr_exp, d_dec
+    #------------------------------------------
+    def get_scales(self, procs : list[str], signal : str) -> tuple[numpy.ndarray,numpy.ndarray]:
+        '''
+        Returns scale factors k, one for each process, and their covariance matrix, meant to be used in:
 
         Nprec = k * Nsignal
 
-        reparametrization, during fit.
+        reparametrization, during fit. The fractions and efficiencies are loaded once and the
+        errors are propagated for all the scales at once, keeping the correlations between them.
+        The process passed when building the object, if any, is not used.
 
         Parameters
         -----------------------
+        procs : List of nicknames of decay processes, e.g. ['bdkskpiee', 'bpkskpiee']
         signal: String representing signal WRT which to scale, e.g. bpkpee
         '''
         self._initialize()
 
-        fr_bkg = self._get_fr(self._proc)
-        br_bkg = self._get_br(self._proc)
-        ef_bkg = self._get_ef(self._proc)
+        l_name, arr_inp, arr_exp, d_dec = self._get_exponents(procs, signal)
+        for proc, d_inp in d_dec.items():
+            self._print_vars(list(d_inp.values()), list(d_inp), proc=proc)
+
+        arr_scl, cov_scl = prp.power_product(arr_inp[:, 0], arr_inp[:, 1] ** 2, arr_exp)
 
-        fr_sig = self._get_fr(signal)
-        br_sig = self._get_br(signal)
-        ef_sig = self._get_ef(signal)
+        log.debug(f'Scales: {dict(zip(procs, arr_scl))}')
+        log.debug(f'Inputs: {l_name}')
 
-        l_tup = [fr_sig, br_sig, ef_sig, fr_bkg, br_bkg, ef_bkg]
-        l_val = [ tup[0] for tup in l_tup]
-        l_err = [ tup[1] for tup in l_tup]
-        cov   = numpy.diag(l_err) ** 2
+        return arr_scl, cov_scl
+    #------------------------------------------
+    def get_scale(self, signal : str) -> tuple[float,float]:
+        '''
+        Returns scale factor k and error, meant to be used in:
+
+        Nprec = k * Nsignal
+
+        reparametrization, during fit.
+
+        Parameters
+        -----------------------
+        signal: String representing signal WRT which to scale, e.g. bpkpee
+        '''
+        if self._proc is None:
+            raise ValueError('Process needed to calculate single scale, use get_scales instead')
 
-        self._print_vars(l_tup[:3], proc=    signal)
-        self._print_vars(l_tup[3:], proc=self._proc)
+        arr_val, cov = self.get_scales(procs=[self._proc], signal=signal)
 
-        val, var = jac.propagate(lambda x : (x[3] * x[4] * x[5]) / (x[0] * x[1] * x[2]), l_val, cov)
-        val = float(val)
-        err = math.sqrt(var)
+        val = float(arr_val[0])
+        err = math.sqrt(cov[0][0])
 
         return val, err
 #------------------------------------------
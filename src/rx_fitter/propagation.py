@@ -0,0 +1,138 @@
+'''
+Module with functions used to propagate uncertainties through products, ratios, differences and normalizations.
+The Jacobians are calculated analytically. The inputs can be arrays with extra leading dimensions,
+e.g. one set of inputs for each process and q2 bin, which are propagated at once.
+'''
+import numpy
+
+from dmu.logging.log_store import LogStore
+
+log=LogStore.add_logger('rx_fitter:propagation')
+#---------------------------
+def _to_covariance(cov : numpy.ndarray, size : int) -> numpy.ndarray:
+    '''
+    Returns covariance matrix, with shape (..., size, size), from either the matrix or the variances, with shape (..., size)
+    '''
+    cov = numpy.asarray(cov, dtype='float64')
+    if cov.shape[-2:] == (size, size) and cov.ndim >= 2:
+        return cov
+
+    if cov.shape[-1] != size:
+        raise ValueError(f'Covariance with shape {cov.shape} does not match inputs of size {size}')
+
+    return cov[..., None] * numpy.eye(size)
+#---------------------------
+def _sandwich(jac : numpy.ndarray, cov : numpy.ndarray) -> numpy.ndarray:
+    '''
+    Returns J C J^T for Jacobian with shape (..., m, n) and covariance with shape (..., n, n)
+    '''
+    return numpy.einsum('...ij,...jk,...lk->...il', jac, cov, jac)
+#---------------------------
+def from_jacobian(jac : numpy.ndarray, cov : numpy.ndarray) -> numpy.ndarray:
+    '''
+    Propagates uncertainties with a Jacobian calculated by the caller, dy_i / dx_j, e.g. for functions
+    mixing differences and ratios. Returns covariance of outputs, J C J^T, with shape (..., m, m)
+
+    jac: Jacobian with shape (..., m, n)
+    cov: Covariance of inputs, with shape (..., n, n), or variances, with shape (..., n)
+    '''
+    jac = numpy.asarray(jac, dtype='float64')
+    cov = _to_covariance(cov, size=jac.shape[-1])
+
+    return _sandwich(jac, cov)
+#---------------------------
+def power_product(val : numpy.ndarray, cov : numpy.ndarray, exponents : numpy.ndarray) -> tuple[numpy.ndarray,numpy.ndarray]:
+    '''
+    Propagates uncertainties to y_i = prod_j x_j ** e_ij, using the Jacobian:
+
+    dy_i / dx_j = e_ij * prod_k x_k ** (e_ik - d_jk)
+
+    which, unlike y_i * e_ij / x_j, is also valid for inputs that are zero.
+
+    Parameters
+    ----------------
+    val      : Values of inputs, x, with shape (..., n), they can only be zero where their exponents are zero or at least one
+    cov      : Covariance of inputs, with shape (..., n, n), or variances, with shape (..., n)
+    exponents: Exponents e with shape (m, n), e.g. [[1, 1, -1]] for x_0 * x_1 / x_2
+
+    Returns
+    ----------------
+    Tuple with values, with shape (..., m), and covariance, with shape (..., m, m)
+    '''
+    val = numpy.asarray(val      , dtype='float64')
+    exp = numpy.asarray(exponents, dtype='float64')
+    cov = _to_covariance(cov, size=val.shape[-1])
+
+    arr_bad = (val[..., None, :] == 0) & (exp != 0) & (exp < 1)
+    if numpy.any(arr_bad):
+        l_index = sorted(set(numpy.nonzero(arr_bad)[-1].tolist()))
+        raise ValueError(f'Inputs {l_index} are zero and have exponents different from zero and smaller than one')
+
+    out = numpy.prod(val[..., None, :] ** exp, axis=-1)
+    # Exponents with shape (m, n, n), where, for the derivative with respect to x_j, the one of x_j is reduced by one
+    # Where e_ij is zero, the derivative is zero, even if x_j ** -1 is not finite, thus these values are masked
+    arr_dex = exp[:, None, :] - numpy.eye(exp.shape[-1])
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        jac = numpy.prod(val[..., None, None, :] ** arr_dex, axis=-1)
+        jac = numpy.where(exp != 0, exp * jac, 0.)
+
+    return out, _sandwich(jac, cov)
+#---------------------------
+def product(val : numpy.ndarray, err : numpy.ndarray) -> tuple[numpy.ndarray,numpy.ndarray]:
+    '''
+    Returns product of independent quantities and its error, along the last axis
+
+    val: Values, e.g. branching fractions, with shape (..., n)
+    err: Errors, same shape
+    '''
+    val = numpy.asarray(val, dtype='float64')
+    err = numpy.asarray(err, dtype='float64')
+    out = numpy.prod(val, axis=-1)
+
+    return out, numpy.abs(out) * numpy.sqrt(numpy.sum((err / val) ** 2, axis=-1))
+#---------------------------
+def ratio(num : numpy.ndarray, num_err : numpy.ndarray, den : numpy.ndarray, den_err : numpy.ndarray) -> tuple[numpy.ndarray,numpy.ndarray]:
+    '''
+    Returns ratio of independent quantities and its error, works element wise on arrays
+    '''
+    num = numpy.asarray(num, dtype='float64')
+    den = numpy.asarray(den, dtype='float64')
+    out = num / den
+    err = numpy.abs(out) * numpy.sqrt((num_err / num) ** 2 + (den_err / den) ** 2)
+
+    return out, err
+#---------------------------
+def difference(val_1 : numpy.ndarray, err_1 : numpy.ndarray, val_2 : numpy.ndarray, err_2 : numpy.ndarray) -> tuple[numpy.ndarray,numpy.ndarray]:
+    '''
+    Returns difference of independent quantities and its error, works element wise on arrays
+    '''
+    out = numpy.asarray(val_1, dtype='float64') - numpy.asarray(val_2, dtype='float64')
+    err = numpy.sqrt(numpy.square(err_1) + numpy.square(err_2))
+
+    return out, err
+#---------------------------
+def normalize(val : numpy.ndarray, cov : numpy.ndarray) -> tuple[numpy.ndarray,numpy.ndarray]:
+    '''
+    Propagates uncertainties to fractions f_i = x_i / sum_j x_j, e.g. from yields, using:
+
+    df_i / dx_j = (delta_ij - f_i) / sum_k x_k
+
+    Parameters
+    ----------------
+    val: Values with shape (..., n)
+    cov: Covariance, with shape (..., n, n), or variances, with shape (..., n)
+
+    Returns
+    ----------------
+    Tuple with fractions, with shape (..., n), and their covariance, with shape (..., n, n)
+    '''
+    val = numpy.asarray(val, dtype='float64')
+    size= val.shape[-1]
+    cov = _to_covariance(cov, size=size)
+
+    tot = numpy.sum(val, axis=-1, keepdims=True)
+    frc = val / tot
+    jac = (numpy.eye(size) - frc[..., :, None]) / tot[..., None]
+
+    return frc, _sandwich(jac, cov)
+#---------------------------
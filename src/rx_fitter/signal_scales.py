@@ -2,15 +2,12 @@
 Module holding SignalScales class
 '''
 import os
-import glob
-import math
-import json
 import numpy
-import jacobi
 import pandas as pnd
 
-from dmu.generic           import version_management as vman
 from dmu.logging.log_store import LogStore
+from rx_fitter             import propagation  as prp
+from rx_fitter             import loader_cache as ldc
 
 log = LogStore.add_logger('rx_fitter:signal_scales')
 # ------------------------------------
@@ -36,7 +33,8 @@ class FitParameters:
         self._trigger   = 'Hlt2RD_BuToKpEE_MVA'
         self._mass      = 'B_M_brem_track_2'
 
-        self._df : pnd.DataFrame
+        self._df    : pnd.DataFrame
+        self._d_par : dict[tuple[str,str],tuple[float,float]] # (kind, Name) -> (value, error)
         self._is_initialized = False
     #------------------------------------------
     def _name_from_parname(self, name : str) -> str:
@@ -83,16 +81,15 @@ class FitParameters:
         sample   = self._mc_sample if kind == 'mc' else 'DATA'
 
         inp_path = f'{self._fit_dir}/{kind}/jpsi'
-        inp_path = vman.get_last_version(dir_path=inp_path, version_only=False)
+        inp_path = ldc.get_last_version(dir_path=inp_path, version_only=False)
         inp_wc   = f'{inp_path}/{sample}_{self._trigger}/{self._mass}_{brem}/*/parameters.json'
-        l_path   = glob.glob(inp_wc)
+        l_path   = ldc.glob(inp_wc)
         npath    = len(l_path)
         if npath != 1:
             raise ValueError(f'No one and only one path found in {inp_wc}')
 
         log.debug(f'Looking for parameters in: {inp_path}')
-        with open(l_path[0], encoding='utf-8') as ifile:
-            d_par = json.load(ifile)
+        d_par = ldc.load_json(l_path[0])
 
         df = self._df_from_pars(d_par)
 
@@ -105,7 +102,7 @@ class FitParameters:
         l_df = []
         for _, df_kind in df.groupby('kind'):
             df          = df_kind[df_kind.Parameter == 'yield']
-            frac, cov   = jacobi.propagate(lambda x : x / numpy.sum(x), df.Value.values, df.Error.values)
+            frac, cov   = prp.normalize(df.Value.values, df.Error.values ** 2)
             df['Value'] = frac
             df['Error'] = numpy.sqrt(numpy.diag(cov))
             df.Parameter= df.Parameter.replace({'yield' : 'frac'})
@@ -157,7 +154,17 @@ class FitParameters:
 
         self._is_initialized = True
 
-        self._df = df
+        self._df    = df
+        self._d_par = self._index_parameters(df)
+    # -----------------------------------
+    def _index_parameters(self, df : pnd.DataFrame) -> dict[tuple[str,str],tuple[float,float]]:
+        '''
+        Returns dictionary mapping (kind, Name) to (value, error), parameters found more than once are left out
+        '''
+        df    = df[~df.duplicated(subset=['kind', 'Name'], keep=False)]
+        d_par = { (kind, name) : (float(val), float(err)) for kind, name, val, err in zip(df.kind, df.Name, df.Value, df.Error) }
+
+        return d_par
     # -----------------------------------
     def get_data(self) -> pnd.DataFrame:
         '''
@@ -174,25 +181,14 @@ class FitParameters:
         self._initialize()
 
         name = name.replace('scale_', '').replace('reso_', '')
-
         kind = 'data' if is_data else 'mc'
-        df   = self._df.copy()
-        df   = df[df.kind == kind ]
-        df   = df[df.Name == name ]
+        key  = kind, name
 
-        if len(df) != 1:
+        if key not in self._d_par:
             log.info(self._df)
-            log.info('--->')
-            log.error(df)
             raise ValueError(f'Not found one and only one row for: {name}')
 
-        log.debug('Using dataframe:\n')
-        log.debug(df)
-
-        val = df.Value.iloc[0]
-        err = df.Error.iloc[0]
-
-        return val, err
+        return self._d_par[key]
     # ------------------------------------
     def get_parameter_scale(self, name : str) -> tuple[float,float]:
         '''
@@ -205,17 +201,63 @@ class FitParameters:
         val_dt, err_dt = self._get_parameter_value(name=name, is_data= True)
         val_mc, err_mc = self._get_parameter_value(name=name, is_data=False)
 
-        cov = [[err_dt ** 2,          0],
-               [          0, err_mc **2]]
-
         if   'scale' in name:
-            scl, var = jacobi.propagate(lambda x : x[0] - x[1], [val_dt, val_mc], cov)
+            scl, err = prp.difference(val_dt, err_dt, val_mc, err_mc)
         elif 'reso'  in name:
-            scl, var = jacobi.propagate(lambda x : x[0] / x[1], [val_dt, val_mc], cov)
+            scl, err = prp.ratio(val_dt, err_dt, val_mc, err_mc)
         else:
             raise ValueError(f'Neither a scale nor a resolution: {name}')
 
-        return scl, math.sqrt(var)
+        return float(scl), float(err)
+    # ------------------------------------
+    def get_parameter_scales(self, names : list[str]) -> tuple[numpy.ndarray,numpy.ndarray]:
+        '''
+        Takes names of scale and resolution parameters, returns array with values of scales and their covariance matrix.
+        Parameters using the same fitted values, e.g. repeated names, are correlated.
+        '''
+        self._initialize()
+
+        l_key = []
+        l_fun = []
+        for name in names:
+            if 'Signal' not in name:
+                raise ValueError(f'Not a signal parameter: {name}')
+
+            if 'scale' not in name and 'reso' not in name:
+                raise ValueError(f'Neither a scale nor a resolution: {name}')
+
+            base = name.replace('scale_', '').replace('reso_', '')
+            keys = ('data', base), ('mc', base)
+            for key in keys:
+                if key not in self._d_par:
+                    raise ValueError(f'Not found one and only one row for: {key}')
+
+            l_key.append(keys)
+            l_fun.append('scale' if 'scale' in name else 'reso')
+
+        l_inp   = list(dict.fromkeys(key for pair in l_key for key in pair))
+        d_index = { key : index for index, key in enumerate(l_inp) }
+        arr_inp = numpy.array([ self._d_par[key] for key in l_inp ]).reshape(-1, 2)
+
+        arr_val = numpy.zeros(len(names))
+        arr_jac = numpy.zeros((len(names), len(l_inp)))
+        for index, ((key_dt, key_mc), fun) in enumerate(zip(l_key, l_fun)):
+            idt, imc = d_index[key_dt], d_index[key_mc]
+            val_dt   = arr_inp[idt, 0]
+            val_mc   = arr_inp[imc, 0]
+
+            if fun == 'scale':
+                arr_val[index]      = val_dt - val_mc
+                arr_jac[index, idt] = +1
+                arr_jac[index, imc] = -1
+            else:
+                arr_val[index]      = val_dt / val_mc
+                arr_jac[index, idt] = 1 / val_mc
+                arr_jac[index, imc] = - val_dt / val_mc ** 2
+
+        cov = prp.from_jacobian(arr_jac, arr_inp[:, 1] ** 2)
+
+        return arr_val, cov
     # ------------------------------------
     def get_brem_fraction(self, name : str, is_data : bool = True) -> tuple[float,float]:
         '''
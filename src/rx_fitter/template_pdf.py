@@ -0,0 +1,112 @@
+'''
+Module with TemplatePDF class and function used to tabulate PDFs that are expensive to evaluate, e.g. KDEs
+'''
+import numpy
+import zfit
+import zfit.z.numpy as znp
+
+from zfit                  import z
+from zfit.core.interfaces  import ZfitSpace as zobs
+from zfit.core.basepdf     import BasePDF   as zpdf
+from dmu.logging.log_store import LogStore
+
+log=LogStore.add_logger('rx_fitter:template_pdf')
+#-------------------------------------------------------------------
+class TemplatePDF(zfit.pdf.BasePDF):
+    '''
+    PDF defined by its values in a regular grid spanning the observable range,
+    linearly interpolated between the grid points
+    '''
+    def __init__(self, obs : zobs, values : numpy.ndarray, name : str = 'TemplatePDF'):
+        '''
+        obs   : Observable, the grid spans its limits
+        values: Values of the density in the grid points, they will be normalized
+        name  : Name of the PDF
+        '''
+        ([[minx]], [[maxx]]) = obs.limits
+
+        arr_x   = numpy.linspace(minx, maxx, len(values))
+        arr_y   = numpy.asarray(values, dtype='float64')
+        width   = float(arr_x[1] - arr_x[0])
+        # Integral from the lower limit up to each grid point, exact for the linear interpolation
+        arr_cdf = numpy.concatenate([[0.], numpy.cumsum(0.5 * (arr_y[1:] + arr_y[:-1]) * width)])
+
+        self.minx    = float(minx)
+        self.maxx    = float(maxx)
+        self.width   = width
+        self.arr_x   = arr_x
+        self.values  = arr_y # Not normalized, such that the same template can be made again from them
+        self.arr_y   = arr_y   / arr_cdf[-1]
+        self.arr_cdf = arr_cdf / arr_cdf[-1]
+
+        super().__init__(obs=obs, params={}, name=name)
+    #-------------------------------------------------------------------
+    def _locate(self, x):
+        '''
+        Returns index of grid interval where x is and position of x within interval, in [0, 1]
+        '''
+        x     = znp.clip(x, self.minx, self.maxx)
+        pos   = (x - self.minx) / self.width
+        index = znp.clip(znp.floor(pos), 0, len(self.arr_y) - 2)
+        frac  = pos - index
+
+        return znp.asarray(index, dtype='int64'), frac
+    #-------------------------------------------------------------------
+    def _unnormalized_pdf(self, x):
+        x           = z.unstack_x(x)
+        index, frac = self._locate(x)
+        y_lo        = znp.take(self.arr_y, index)
+        y_hi        = znp.take(self.arr_y, index + 1)
+
+        return y_lo + frac * (y_hi - y_lo)
+    #-------------------------------------------------------------------
+    def integrate_to(self, x):
+        '''
+        Returns integral of the PDF from the lower limit of the observable up to x
+        '''
+        index, frac = self._locate(x)
+        y_lo        = znp.take(self.arr_y  , index)
+        y_hi        = znp.take(self.arr_y  , index + 1)
+        c_lo        = znp.take(self.arr_cdf, index)
+
+        return c_lo + self.width * (y_lo * frac + 0.5 * (y_hi - y_lo) * frac ** 2)
+#-------------------------------------------------------------------
+def _template_integral(limits, params, model, **_):
+    # pylint: disable=unused-argument
+    lower, upper = limits.limit1d
+
+    return model.integrate_to(upper) - model.integrate_to(lower)
+#-------------------------------------------------------------------
+_limits = zfit.Space(axes=0, limits=(zfit.Space.ANY_LOWER, zfit.Space.ANY_UPPER))
+TemplatePDF.register_analytic_integral(func=_template_integral, limits=_limits)
+#-------------------------------------------------------------------
+def tabulate(pdf : zpdf, npoints : int) -> TemplatePDF:
+    '''
+    Returns template with the values of a PDF in `npoints` equally spaced points.
+    The largest difference between the template and the PDF, relative to the maximum
+    of the PDF, is evaluated in the middle of the grid intervals, logged and stored in
+    the `max_error` attribute of the template.
+
+    pdf    : Unbinned one dimensional zfit PDF, if extended, the template will have the same yield
+    npoints: Number of points in grid
+    '''
+    obs   = pdf.space
+    ([[minx]], [[maxx]]) = obs.limits
+
+    arr_x = numpy.linspace(minx, maxx, npoints)
+    arr_y = numpy.asarray(pdf.pdf(arr_x))
+    tpl   = TemplatePDF(obs=obs, values=arr_y, name=pdf.name)
+
+    if pdf.is_extended:
+        tpl.set_yield(pdf.get_yield())
+
+    arr_mid = 0.5 * (arr_x[1:] + arr_x[:-1])
+    arr_exa = numpy.asarray(pdf.pdf(arr_mid))
+    arr_tpl = numpy.asarray(tpl.pdf(arr_mid))
+    max_err = numpy.max(numpy.abs(arr_tpl - arr_exa)) / numpy.max(arr_exa)
+    tpl.max_error = float(max_err)
+
+    log.info(f'Tabulated {pdf.name} in {npoints} points, maximum interpolation error: {100 * max_err:.3f}%')
+
+    return tpl
+#-------------------------------------------------------------------
@@ -0,0 +1,47 @@
+'''
+Script used to calculate the efficiencies needed by the PRec scales, for several q2 bins and working points, before the fits
+'''
+import argparse
+
+from dmu.logging.log_store      import LogStore
+from rx_fitter.efficiency_store import EfficiencyStore
+
+log = LogStore.add_logger('rx_fitter:precompute_efficiencies')
+# --------------------------------
+class Data:
+    '''
+    Data class
+    '''
+    l_q2bin : list[str]
+    l_wp    : list[str]
+    nproc   : int
+# --------------------------------
+def _parse_args():
+    parser = argparse.ArgumentParser(description='Script used to fill the store of efficiencies used by the PRec scales')
+    parser.add_argument('-q', '--q2bin', nargs='+', type=str, help='q2 bins', default=['low', 'central', 'high'])
+    parser.add_argument('-w', '--wp'   , nargs='+', type=str, help='MVA working points, e.g. "mva_cmb > 0.8 && mva_prc > 0.6", by default, the default selection', default=[])
+    parser.add_argument('-n', '--nproc', type=int, help='Number of processes', default=4)
+    parser.add_argument('-d', '--dir'  , type=str, help='Directory with efficiencies, if not passed, will use default')
+    args = parser.parse_args()
+
+    if args.dir is not None:
+        EfficiencyStore.root = args.dir
+
+    Data.l_q2bin = args.q2bin
+    Data.l_wp    = args.wp
+    Data.nproc   = args.nproc
+# --------------------------------
+def main():
+    '''
+    Start here
+    '''
+    _parse_args()
+
+    l_sel  = [ {'bdt' : wp} for wp in Data.l_wp ] if len(Data.l_wp) > 0 else [{}]
+    l_path = EfficiencyStore.precompute(q2bins=Data.l_q2bin, selections=l_sel, nproc=Data.nproc)
+
+    for path in l_path:
+        log.info(path)
+# --------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+'''
+Script used to inspect and prune the directory where rx_fitter caches objects
+'''
+import argparse
+
+from dmu.logging.log_store     import LogStore
+from rx_fitter.cache_manager   import CacheManager
+
+log = LogStore.add_logger('rx_fitter:rx_cache')
+# --------------------------------
+class Data:
+    '''
+    Data class
+    '''
+    command  : str
+    max_size : float | None
+# --------------------------------
+def _parse_args():
+    parser = argparse.ArgumentParser(description='Script used to inspect and prune the rx_fitter cache')
+    parser.add_argument('-r', '--root', type=str, help='Root directory of cache, if not passed, will use default')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('show', help='Show number of files and size for each kind of cached object')
+
+    prune = subparsers.add_parser('prune', help='Remove least recently used files')
+    prune.add_argument('-s', '--max_size', type=float, help='Size in GB the cache will be reduced to, by default the configured maximum')
+
+    args = parser.parse_args()
+
+    if args.root is not None:
+        CacheManager.root = args.root
+
+    Data.command  = args.command
+    Data.max_size = getattr(args, 'max_size', None)
+# --------------------------------
+def _show() -> None:
+    df = CacheManager.get_stats()
+    df = df.drop(columns=['Hits', 'Misses'])
+
+    log.info(f'Cache in: {CacheManager.root}')
+    log.info(f'Maximum size: {CacheManager.max_size / 1024 ** 3:.1f} GB')
+    log.info('\n' + df.to_string(index=False))
+# --------------------------------
+def _prune() -> None:
+    max_size  = None if Data.max_size is None else int(Data.max_size * 1024 ** 3)
+    l_removed = CacheManager.prune(max_size=max_size)
+
+    for path in l_removed:
+        log.debug(f'Removed: {path}')
+
+    log.info(f'Removed {len(l_removed)} files')
+# --------------------------------
+def main():
+    '''
+    Start here
+    '''
+    _parse_args()
+
+    if Data.command == 'show':
+        _show()
+        return
+
+    _prune()
+# --------------------------------
+if __name__ == '__main__':
+    main()
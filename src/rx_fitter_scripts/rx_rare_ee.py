@@ -31,7 +31,9 @@ from rx_misid.misid_pdf          import MisIdPdf
 from rx_data.rdf_getter          import RDFGetter
 from rx_selection                import selection  as sel
 from rx_fitter                   import components as cmp
+from rx_fitter                   import columns    as rcol
 from rx_fitter.prec              import PRec
+from rx_fitter.cache_manager     import CacheManager
 from rx_fitter.constraint_reader import ConstraintReader
 
 log=LogStore.add_logger('rx_fitter:rx_rare_ee')
@@ -272,15 +274,25 @@ def _get_data() -> zdata:
     log.info('Getting data')
     log.info(20 * '-')
     data_path = f'{Data.fit_dir}/data.json'
-    if os.path.isfile(data_path):
+    # Jobs running the same fit wait for the first one to extract the data, then read it
+    with CacheManager.lock(data_path):
+        if not os.path.isfile(data_path):
+            _make_data(data_path)
+
         log.warning(f'Caching data from: {data_path}')
         df   = pnd.read_json(data_path)
         data = zfit.Data.from_pandas(df=df, obs=Data.obs)
 
-        return data
-
+    return data
+# --------------------------
+def _make_data(data_path : str) -> None:
+    '''
+    Will extract the masses from the real data and save them atomically to `data_path`
+    '''
+    mass  = Data.mass.replace('_smr_', '_') # Real data is not smeared
+    l_col = rcol.from_expressions(list(Data.d_total_sel.values()) + [mass])
     gtr   = RDFGetter(sample=Data.sample, trigger=Data.trigger)
-    rdf   = gtr.get_rdf()
+    rdf   = gtr.get_rdf(columns=l_col)
     for cut_name, cut_expr in Data.d_total_sel.items():
         log.info(f'{cut_name:<20}{cut_expr}')
         rdf = rdf.Filter(cut_expr, cut_name)
@@ -293,13 +305,12 @@ def _get_data() -> zdata:
     df = rut.rdf_report_to_df(rep)
     df.to_json(f'{Data.fit_dir}/cutflow.json', indent=2)
 
-    mass = Data.mass.replace('_smr_', '_') # Real data is not smeared
     log.info(f'Using mass {mass} for real data')
 
     arr_mass = rdf.AsNumpy([mass])[mass]
-    data     = zfit.Data.from_numpy(obs=Data.obs, array=arr_mass)
-
-    return data
+    df       = pnd.DataFrame({Data.obs.obs[0] : arr_mass})
+    with CacheManager.atomic_path(data_path) as tmp_path:
+        df.to_json(tmp_path, indent=2)
 # --------------------------
 def _get_constraints(pdf : zpdf) -> dict[str,tuple[float,float]]:
     s_par  = pdf.get_params()
@@ -401,6 +412,11 @@ def _initialize_settings(cfg : dict) -> None:
         Data.d_custom_sel = {}
 
     Data.mid_vers = Data.comp['misid']['version']
+
+    # The KDEs do not change during the fit, they can be replaced by templates that are faster to evaluate
+    template_points          = cfg['input'].get('template_points', 0)
+    PRec.template_points     = template_points
+    cmp.Data.template_points = template_points
     Data.obs      = zfit.Space(Data.mass, limits=(Data.minx, Data.maxx))
 # --------------------------
 @gut.timeit
@@ -0,0 +1,167 @@
+'''
+Module with tests for CacheManager class
+'''
+import os
+import time
+import threading
+import multiprocessing
+
+import pytest
+
+from dmu.logging.log_store   import LogStore
+from rx_fitter.cache_manager import CacheManager
+
+log=LogStore.add_logger('rx_fitter:test_cache_manager')
+#-----------------------------------------------
+class Data:
+    '''
+    Data class
+    '''
+    out_dir = '/tmp/tests/rx_fitter/cache_manager'
+#-----------------------------------------------
+@pytest.fixture(scope='session', autouse=True)
+def _initialize():
+    LogStore.set_level('rx_fitter:cache_manager', 10)
+#-----------------------------------------------
+def _make_file(kind : str, name : str, size : int) -> str:
+    path = CacheManager.get_path(kind=kind, name=name)
+    with open(path, 'wb') as ofile:
+        ofile.write(b'0' * size)
+
+    CacheManager.stored(path)
+
+    return path
+#-----------------------------------------------
+def test_hit_miss():
+    '''
+    Tests counting of hits and misses
+    '''
+    with CacheManager.apply_setting(root=f'{Data.out_dir}/hit_miss'):
+        path = CacheManager.get_path(kind='prec', name='missing.npy')
+        assert not CacheManager.is_cached(path)
+
+        path = _make_file(kind='prec', name='found.npy', size=10)
+        assert CacheManager.is_cached(path)
+
+        df = CacheManager.get_stats()
+        log.info(df)
+
+    assert df.Hits.sum()   >= 1
+    assert df.Misses.sum() >= 1
+#-----------------------------------------------
+def test_eviction():
+    '''
+    Tests that the least recently used files, and their locks, are removed when the cache is too large
+    '''
+    with CacheManager.apply_setting(root=f'{Data.out_dir}/eviction', max_size=2500):
+        CacheManager.prune(max_size=0)
+
+        path_1 = _make_file(kind='prec'         , name='file_1.npy', size=1000)
+        time.sleep(0.01)
+        with CacheManager.lock(path_1):
+            pass
+
+        path_2 = _make_file(kind='decay_weights', name='file_2.npz', size=1000)
+        with CacheManager.lock(path_2):
+            pass
+
+        time.sleep(0.01)
+        CacheManager.is_cached(path_1)
+        time.sleep(0.01)
+        path_3 = _make_file(kind='prec'         , name='file_3.npy', size=1000)
+
+    assert     os.path.isfile(path_1)
+    assert not os.path.isfile(path_2)
+    assert     os.path.isfile(path_3)
+
+    assert     os.path.isfile(f'{path_1}.lock')
+    assert not os.path.isfile(f'{path_2}.lock')
+#-----------------------------------------------
+def test_invalid_kind():
+    '''
+    Tests that only managed directories can be used
+    '''
+    with pytest.raises(ValueError):
+        CacheManager.get_dir(kind='not_a_kind')
+#-----------------------------------------------
+def _append_locked(path : str) -> None:
+    with CacheManager.lock(path):
+        with open(path, 'a', encoding='utf-8') as ofile:
+            ofile.write('start\n')
+
+        time.sleep(0.05)
+
+        with open(path, 'a', encoding='utf-8') as ofile:
+            ofile.write('end\n')
+#-----------------------------------------------
+def test_lock():
+    '''
+    Tests that jobs holding the lock of a file do not overlap
+    '''
+    path = f'{Data.out_dir}/lock/file.txt'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.isfile(path):
+        os.remove(path)
+
+    l_proc = [ multiprocessing.Process(target=_append_locked, args=(path,)) for _ in range(4) ]
+    for proc in l_proc:
+        proc.start()
+
+    for proc in l_proc:
+        proc.join()
+
+    with open(path, encoding='utf-8') as ifile:
+        l_line = ifile.read().splitlines()
+
+    assert l_line == 4 * ['start', 'end']
+#-----------------------------------------------
+def test_lock_threads():
+    '''
+    Tests that threads of the same process holding the lock of a file do not overlap
+    '''
+    path = f'{Data.out_dir}/lock_threads/file.txt'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.isfile(path):
+        os.remove(path)
+
+    l_thread = [ threading.Thread(target=_append_locked, args=(path,)) for _ in range(4) ]
+    for thread in l_thread:
+        thread.start()
+
+    for thread in l_thread:
+        thread.join()
+
+    with open(path, encoding='utf-8') as ifile:
+        l_line = ifile.read().splitlines()
+
+    assert l_line == 4 * ['start', 'end']
+#-----------------------------------------------
+def test_atomic_path():
+    '''
+    Tests that files are only replaced when the writing succeeds
+    '''
+    with CacheManager.apply_setting(root=f'{Data.out_dir}/atomic'):
+        path = CacheManager.get_path(kind='prec', name='file.txt')
+        with CacheManager.atomic_path(path) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as ofile:
+                ofile.write('good')
+
+        with pytest.raises(RuntimeError):
+            with CacheManager.atomic_path(path) as tmp_path:
+                with open(tmp_path, 'w', encoding='utf-8') as ofile:
+                    ofile.write('bad')
+
+                raise RuntimeError('Failed writing')
+
+        l_file = CacheManager._get_files()
+
+    with open(path, encoding='utf-8') as ifile:
+        assert ifile.read() == 'good'
+
+    umask = os.umask(0)
+    os.umask(umask)
+
+    assert os.stat(path).st_mode & 0o777 == 0o666 & ~umask
+
+    assert [ file_path for _, file_path, _, _ in l_file ] == [path]
+#-----------------------------------------------
@@ -0,0 +1,28 @@
+'''
+Module with tests for functions in columns module
+'''
+import pytest
+
+from rx_fitter import columns as rcol
+
+#-----------------------------------------------
+@pytest.mark.parametrize('expr, l_column', [
+    ('(abs(B_TRUEID) == 521) & (abs(Jpsi_TRUEID) == 443)'    , ['B_TRUEID', 'Jpsi_TRUEID']),
+    ('TMath::Abs(H_MC_MOTHER_ID) != 313 && q2 > 1.1e6'        , ['H_MC_MOTHER_ID', 'q2']),
+    ('(B_Mass > 4500) and (mva_cmb > 0.5) or true'            , ['B_Mass', 'mva_cmb']),
+    ('std::sqrt (Jpsi_M * Jpsi_M) < 3100'                     , ['Jpsi_M']),
+    ])
+def test_from_expressions(expr : str, l_column : list[str]):
+    '''
+    Tests extraction of column names from expressions
+    '''
+    assert rcol.from_expressions([expr]) == l_column
+#-----------------------------------------------
+def test_merge():
+    '''
+    Tests that columns from multiple expressions are merged
+    '''
+    l_column = rcol.from_expressions(['B_Mass > 0', 'B_Mass < 6000 & H_PT > 500'])
+
+    assert l_column == ['B_Mass', 'H_PT']
+#-----------------------------------------------
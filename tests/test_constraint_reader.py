@@ -2,6 +2,7 @@
 Module with functions needed to test ConstraintReader class
 '''
 
+import numpy
 import pytest
 from dmu.logging.log_store       import LogStore
 from rx_fitter.constraint_reader import ConstraintReader
@@ -89,3 +90,25 @@ def test_all():
 
     assert len(d_cns) > 0
 # --------------------------------------------------------------
+def test_covariance():
+    '''
+    Tests getting covariance matrix of constrained parameters, in the order of the parameters
+    '''
+    q2bin     = 'central'
+    l_par     = Data.l_brem_frac + Data.l_sig_par + Data.l_prec_par
+
+    obj         = ConstraintReader(parameters = l_par, q2bin=q2bin)
+    d_cns       = obj.get_constraints()
+    l_name, cov = obj.get_covariance()
+
+    assert l_name    == list(d_cns)
+    assert l_name    == [ par for par in l_par if par in d_cns ]
+    assert cov.shape == (len(l_name), len(l_name))
+    assert numpy.allclose(cov, cov.T)
+    assert numpy.allclose(numpy.sqrt(numpy.diag(cov)), [ err for _, err in d_cns.values() ])
+
+    ind_1 = l_name.index(Data.l_prec_par[0])
+    ind_2 = l_name.index(Data.l_prec_par[1])
+
+    assert cov[ind_1, ind_2] != 0 # Scales share the signal efficiency
+# --------------------------------------------------------------
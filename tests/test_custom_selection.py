@@ -0,0 +1,38 @@
+'''
+Module with tests for functions in custom_selection module
+'''
+from rx_selection          import selection as sel
+from rx_fitter             import custom_selection as csl
+#-----------------------------------------------
+def test_key():
+    '''
+    Tests that the key follows the content of the custom selection
+    '''
+    sel.reset_custom_selection()
+    key_1 = csl.get_key()
+    sel.set_custom_selection(d_cut = {'bdt' : 'mva_cmb > 0.5'})
+    key_2 = csl.get_key()
+    sel.reset_custom_selection()
+    sel.set_custom_selection(d_cut = {'bdt' : 'mva_cmb > 0.5'})
+    key_3 = csl.get_key()
+    sel.reset_custom_selection()
+
+    assert key_1 == csl.get_key()
+    assert key_1 != key_2
+    assert key_2 == key_3
+#-----------------------------------------------
+def test_get_custom_selection():
+    '''
+    Tests that a copy of the custom selection is returned
+    '''
+    sel.reset_custom_selection()
+    sel.set_custom_selection(d_cut = {'bdt' : 'mva_cmb > 0.5'})
+    d_cut = csl.get_custom_selection()
+    d_cut['bdt'] = 'mva_cmb > 0.9'
+
+    assert csl.get_custom_selection() == {'bdt' : 'mva_cmb > 0.5'}
+
+    sel.reset_custom_selection()
+
+    assert csl.get_custom_selection() is None
+#-----------------------------------------------
@@ -0,0 +1,84 @@
+'''
+Module with tests for EfficiencyStore class
+'''
+import os
+
+import pytest
+
+from dmu.logging.log_store      import LogStore
+from rx_selection               import selection as sel
+from rx_fitter                  import custom_selection as csl
+from rx_fitter.cache_manager    import CacheManager
+from rx_fitter.efficiency_store import EfficiencyStore
+
+log=LogStore.add_logger('rx_fitter:test_efficiency_store')
+#-----------------------------------------------
+class Data:
+    '''
+    Data class
+    '''
+    out_dir = '/tmp/tests/rx_fitter/efficiency_store'
+#-----------------------------------------------
+@pytest.fixture(scope='session', autouse=True)
+def _initialize():
+    LogStore.set_level('rx_fitter:efficiency_store', 10)
+#-----------------------------------------------
+def test_path():
+    '''
+    Tests that each working point has its own file
+    '''
+    with EfficiencyStore.apply_setting(root=f'{Data.out_dir}/path'):
+        path_1 = EfficiencyStore.get_path(q2bin='central')
+
+        sel.set_custom_selection(d_cut = {'bdt' : 'mva_cmb > 0.9'})
+        path_2 = EfficiencyStore.get_path(q2bin='central')
+        sel.reset_custom_selection()
+
+        path_3 = EfficiencyStore.get_path(q2bin='central')
+
+    assert path_1 != path_2
+    assert path_1 == path_3
+    assert path_1.startswith(f'{Data.out_dir}/path/central/')
+#-----------------------------------------------
+def test_precompute():
+    '''
+    Tests calculating efficiencies in parallel and loading them
+    '''
+    l_sel = [{}, {'bdt' : 'mva_cmb > 0.9 && mva_prc > 0.8'}]
+    with EfficiencyStore.apply_setting(root=f'{Data.out_dir}/precompute'):
+        l_path = EfficiencyStore.precompute(q2bins=['central'], selections=l_sel, nproc=2)
+        df     = EfficiencyStore.load(q2bin='central')
+
+    assert len(set(l_path)) == 2
+    assert all(os.path.isfile(path) for path in l_path)
+    assert {'Process', 'Passed', 'Total'} <= set(df.columns)
+#-----------------------------------------------
+def test_default_root(monkeypatch):
+    '''
+    Tests that, by default, the efficiencies are stored in the cache directory
+    '''
+    monkeypatch.setattr(EfficiencyStore, 'root', None)
+    with CacheManager.apply_setting(root=f'{Data.out_dir}/cache'):
+        path = EfficiencyStore.get_path(q2bin='central')
+
+    assert path.startswith(f'{Data.out_dir}/cache/efficiencies/central/')
+#-----------------------------------------------
+def test_precompute_in_process():
+    '''
+    Tests that the custom selection and the directory are restored after calculating the efficiencies in this process
+    '''
+    d_cut = {'bdt' : 'mva_cmb > 0.8'}
+    l_sel = [{'bdt' : 'mva_cmb > 0.9 && mva_prc > 0.8'}]
+
+    sel.reset_custom_selection()
+    sel.set_custom_selection(d_cut = d_cut)
+    with EfficiencyStore.apply_setting(root=f'{Data.out_dir}/in_process'):
+        EfficiencyStore.precompute(q2bins=['central'], selections=l_sel, nproc=1)
+
+        assert EfficiencyStore.root == f'{Data.out_dir}/in_process'
+
+    d_cut_restored = csl.get_custom_selection()
+    sel.reset_custom_selection()
+
+    assert d_cut_restored == d_cut
+#-----------------------------------------------
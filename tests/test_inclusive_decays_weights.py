@@ -4,13 +4,15 @@ Module with tests for Reader class in inclusive_decays_weights module
 
 import os
 import yaml
+import numpy
 import pytest
 import pandas            as pnd
 import matplotlib.pyplot as plt
 
 from ROOT                               import RDataFrame
 from dmu.logging.log_store              import LogStore
-from rx_fitter.inclusive_decays_weights import Reader
+from rx_fitter.cache_manager            import CacheManager
+from rx_fitter.inclusive_decays_weights import Reader, ArrayReader, WeightTable
 
 log=LogStore.add_logger('rx_fitter:test_inclusive_decays_weights')
 #-----------------------------------------------
@@ -24,6 +26,7 @@ class Data:
         ('Bs_JpsiX_ee_eq_JpsiInAcc', 'Hlt2RD_BuToKpEE_MVA'),
         ]
 
+    l_pid        = [0, 11, -11, 22, 211, -211, 221, 310, 313, 321, -321, 323, 325, 333, 443, 100443, 511, -511, 521, -521, 531, -531]
     samples_yaml = '/home/acampove/external_ssd/Data/samples/main.yaml'
     out_dir      = '/tmp/tests/rx_fitter/inclusive_decays_weights'
 #-----------------------------------------------
@@ -50,6 +53,17 @@ def _get_df(sample : str, trigger : str) -> pnd.DataFrame:
 
     return df
 #-----------------------------------------------
+def _get_random_df(nentries : int) -> pnd.DataFrame:
+    rng    = numpy.random.default_rng(seed=42)
+    d_data = {}
+    for particle in ['L1', 'L2', 'H']:
+        for kind in ['TRUEID', 'MC_MOTHER_ID', 'MC_GD_MOTHER_ID', 'MC_GD_GD_MOTHER_ID']:
+            d_data[f'{particle}_{kind}'] = rng.choice(Data.l_pid, size=nentries).astype('int32')
+
+    d_data['mass'] = rng.normal(loc=5000, scale=300, size=nentries)
+
+    return pnd.DataFrame(d_data)
+#-----------------------------------------------
 def _plot_mass(df : pnd.DataFrame, sample : str, test : str):
     _, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
     ax1.hist(df.mass, bins=50, range=[4500, 6000], histtype='step', density=True, label='Unweighted', )
@@ -83,3 +97,48 @@ def test_simple(sample : str, trigger : str):
 
     _plot_mass(df, sample, 'simple')
 #-----------------------------------------------
+@pytest.mark.parametrize('sample, trigger', Data.l_sample)
+def test_vectorized(sample : str, trigger : str):
+    '''
+    Tests that columnar weights are the same as the row-wise ones
+    '''
+    df      = _get_df(sample, trigger)
+    arr_row = df.apply(Reader.read_weight, args=('L1', 'L2', 'H'), axis=1).to_numpy()
+    arr_col = ArrayReader.read_weights(df, 'L1', 'L2', 'H')
+
+    assert numpy.array_equal(arr_row, arr_col)
+#-----------------------------------------------
+def test_vectorized_random():
+    '''
+    Tests that columnar weights are the same as the row-wise ones
+    for random decay chains, such that all the rules are exercised
+    '''
+    df      = _get_random_df(nentries=50_000)
+    arr_row = df.apply(Reader.read_weight, args=('L1', 'L2', 'H'), axis=1).to_numpy()
+    arr_col = ArrayReader.read_weights(df, 'L1', 'L2', 'H')
+
+    assert numpy.array_equal(arr_row, arr_col)
+    assert len(numpy.unique(arr_col)) > 1
+#-----------------------------------------------
+def test_table_random():
+    '''
+    Tests that weights from table of decay topologies are the same as the columnar ones,
+    both when the table is built and when it is loaded from disk
+    '''
+    df      = _get_random_df(nentries=50_000)
+    df      = pnd.concat([df, df, df], axis=0)
+    arr_col = ArrayReader.read_weights(df, 'L1', 'L2', 'H')
+
+    with CacheManager.apply_setting(root=f'{Data.out_dir}/cache'):
+        obj     = WeightTable(df, particles=['L1', 'L2', 'H'])
+        arr_tab = obj.get_weights()
+
+        assert numpy.array_equal(arr_col, arr_tab)
+
+        WeightTable._d_table = {}
+
+        obj     = WeightTable(df, particles=['L1', 'L2', 'H'])
+        arr_tab = obj.get_weights()
+
+    assert numpy.array_equal(arr_col, arr_tab)
+#-----------------------------------------------
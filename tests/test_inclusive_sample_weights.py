@@ -27,3 +27,18 @@ def test_simple():
 
     print(df)
 #------------------------------------
+def test_per_process():
+    '''
+    Tests that weights are the same for all the candidates of a process
+    and that they are aligned with the dataframe
+    '''
+    df            = _get_df()
+    df.index      = df.index[::-1]
+    obj           = Reader(df)
+    df['wgt_sam'] = obj.get_weights()
+
+    for _, df_proc in df.groupby('proc'):
+        assert df_proc.wgt_sam.nunique() == 1
+
+    assert df.wgt_sam.notna().all()
+#------------------------------------
@@ -0,0 +1,117 @@
+'''
+Module with tests for functions in loader_cache module
+'''
+import os
+import time
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+import pytest
+
+from dmu.logging.log_store import LogStore
+from rx_fitter             import loader_cache as ldc
+
+log=LogStore.add_logger('rx_fitter:test_loader_cache')
+#-----------------------------------------------
+class Data:
+    '''
+    Data class
+    '''
+    out_dir = '/tmp/tests/rx_fitter/loader_cache'
+#-----------------------------------------------
+@pytest.fixture(scope='session', autouse=True)
+def _initialize():
+    LogStore.set_level('rx_fitter:loader_cache', 10)
+#-----------------------------------------------
+def _make_dir(name : str) -> str:
+    dir_path = f'{Data.out_dir}/{name}'
+    shutil.rmtree(dir_path, ignore_errors=True)
+    os.makedirs(dir_path)
+
+    return dir_path
+#-----------------------------------------------
+def _touch_later(path : str) -> None:
+    '''
+    Makes sure that the modification time changes, even in file systems with coarse time stamps
+    '''
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+#-----------------------------------------------
+def test_load_yaml():
+    '''
+    Tests that content is reused, copied and reloaded when the file changes
+    '''
+    dir_path = _make_dir('yaml')
+    path     = f'{dir_path}/data.yaml'
+    with open(path, 'w', encoding='utf-8') as ofile:
+        yaml.safe_dump({'a' : [1, 2]}, ofile)
+
+    data_1 = ldc.load_yaml(path)
+    data_1['a'].append(3)
+    data_2 = ldc.load_yaml(path)
+
+    assert data_2 == {'a' : [1, 2]}
+
+    with open(path, 'w', encoding='utf-8') as ofile:
+        yaml.safe_dump({'a' : [4]}, ofile)
+    _touch_later(path)
+
+    assert ldc.load_yaml(path) == {'a' : [4]}
+#-----------------------------------------------
+def test_threads():
+    '''
+    Tests loading the same file from several threads
+    '''
+    dir_path = _make_dir('threads')
+    path     = f'{dir_path}/data.json'
+    with open(path, 'w', encoding='utf-8') as ofile:
+        json.dump({'x' : list(range(100))}, ofile)
+
+    ldc.clear()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        l_data = list(pool.map(lambda _ : ldc.load_json(path), range(100)))
+
+    assert all(data == {'x' : list(range(100))} for data in l_data)
+#-----------------------------------------------
+def test_versions_and_glob():
+    '''
+    Tests that new versions and new files are picked up
+    '''
+    dir_path = _make_dir('versions')
+    for version in ['v1', 'v2']:
+        os.makedirs(f'{dir_path}/{version}/fit_1')
+        with open(f'{dir_path}/{version}/fit_1/parameters.json', 'w', encoding='utf-8') as ofile:
+            json.dump({}, ofile)
+
+    assert ldc.get_last_version(dir_path=dir_path, version_only=True) == 'v2'
+    assert ldc.glob(f'{dir_path}/v2/*/parameters.json') == [f'{dir_path}/v2/fit_1/parameters.json']
+
+    time.sleep(0.01)
+    os.makedirs(f'{dir_path}/v3/fit_1')
+    os.makedirs(f'{dir_path}/v2/fit_2')
+    with open(f'{dir_path}/v2/fit_2/parameters.json', 'w', encoding='utf-8') as ofile:
+        json.dump({}, ofile)
+    _touch_later(dir_path)
+    _touch_later(f'{dir_path}/v2')
+
+    assert ldc.get_last_version(dir_path=dir_path, version_only=True) == 'v3'
+    assert len(ldc.glob(f'{dir_path}/v2/*/parameters.json')) == 2
+
+    # File added to an existing subdirectory, which does not change the modification time of v2
+    os.makedirs(f'{dir_path}/v3/fit_2')
+    assert ldc.glob(f'{dir_path}/v3/*/parameters.json') == []
+
+    with open(f'{dir_path}/v3/fit_1/parameters.json', 'w', encoding='utf-8') as ofile:
+        json.dump({}, ofile)
+    _touch_later(f'{dir_path}/v3/fit_1')
+
+    assert ldc.glob(f'{dir_path}/v3/*/parameters.json') == [f'{dir_path}/v3/fit_1/parameters.json']
+
+    with open(f'{dir_path}/v3/fit_2/parameters.json', 'w', encoding='utf-8') as ofile:
+        json.dump({}, ofile)
+    _touch_later(f'{dir_path}/v3/fit_2')
+
+    assert len(ldc.glob(f'{dir_path}/v3/*/parameters.json')) == 2
+#-----------------------------------------------
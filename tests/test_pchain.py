@@ -0,0 +1,82 @@
+'''
+Module with tests for PChain and PChainArray classes
+'''
+
+import numpy
+import pytest
+
+from rx_fitter.pchain import PChain, PChainArray
+
+#-----------------------------------------------
+class Data:
+    '''
+    Data class
+    '''
+    l_pid = [0, 11, -11, 211, 313, 321, -321, 443, 100443, 511, 521, -521, 531]
+#-----------------------------------------------
+def _get_chains(nentries : int) -> PChainArray:
+    rng   = numpy.random.default_rng(seed=10)
+    l_arr = [ rng.choice(Data.l_pid, size=nentries) for _ in range(4) ]
+
+    return PChainArray(*l_arr)
+#-----------------------------------------------
+def _check_predicate(chains : PChainArray, method : str, *args) -> None:
+    arr_flg = getattr(chains, method)(*args)
+    l_flg   = [ bool(getattr(chain, method)(*args)) for chain in (chains[index] for index in range(len(chains))) ]
+
+    assert arr_flg.dtype == bool
+    assert arr_flg.tolist() == l_flg
+#-----------------------------------------------
+def test_view():
+    '''
+    Tests that indexing returns scalar PChain with the right IDs
+    '''
+    chains = _get_chains(nentries=100)
+    chain  = chains[10]
+
+    assert isinstance(chain, PChain)
+    assert chain.ID()    == chains.ID()[10]
+    assert chain.MID()   == chains.MID()[10]
+    assert chain.GMID()  == chains.GMID()[10]
+    assert chain.GGMID() == chains.GGMID()[10]
+#-----------------------------------------------
+@pytest.mark.parametrize('l_dec_id', [[321], [321, 313], [-321, 313, 511], [321, 443, 100443, 521], [1, 2, 3, 4, 5]])
+def test_match_decay(l_dec_id : list[int]):
+    '''
+    Tests MatchDecay against scalar implementation
+    '''
+    chains = _get_chains(nentries=5_000)
+    _check_predicate(chains, 'MatchDecay', l_dec_id)
+#-----------------------------------------------
+@pytest.mark.parametrize('pid', [521, -521, 100443])
+def test_has_in_chain(pid : int):
+    '''
+    Tests HasInChain against scalar implementation
+    '''
+    chains = _get_chains(nentries=5_000)
+    _check_predicate(chains, 'HasInChain', pid)
+#-----------------------------------------------
+@pytest.mark.parametrize('first, head', [(100443, 521), (100443, 511), (443, 531)])
+def test_match_upstream(first : int, head : int):
+    '''
+    Tests MatchUpstream against scalar implementation
+    '''
+    chains = _get_chains(nentries=5_000)
+    _check_predicate(chains, 'MatchUpstream', first, head)
+#-----------------------------------------------
+@pytest.mark.parametrize('method', ['MatchID', 'MatchMother', 'MatchGMother', 'MatchGGMother'])
+@pytest.mark.parametrize('pid'   , [321, -521])
+def test_match_single(method : str, pid : int):
+    '''
+    Tests matching of single particle in chain against scalar implementation
+    '''
+    chains = _get_chains(nentries=5_000)
+    _check_predicate(chains, method, pid)
+#-----------------------------------------------
+def test_bad_shapes():
+    '''
+    Tests that arrays of different sizes are rejected
+    '''
+    with pytest.raises(ValueError):
+        PChainArray([1, 2], [1, 2], [1, 2], [1])
+#-----------------------------------------------
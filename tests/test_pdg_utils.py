@@ -0,0 +1,74 @@
+'''
+Module with tests for functions in pdg_utils module
+'''
+
+import os
+
+import pdg
+import pytest
+
+from dmu.logging.log_store import LogStore
+from rx_fitter             import pdg_utils as pu
+from rx_fitter.cache_manager import CacheManager
+
+log=LogStore.add_logger('rx_fitter:test_pdg_utils')
+#-----------------------------------------------
+class Data:
+    '''
+    Data class
+    '''
+    l_decay = [
+            'B+ --> J/psi(1S) K+',
+            'B0 --> J/psi(1S) K0',
+            'B_s()0 --> J/psi(1S) phi']
+
+    out_dir = '/tmp/tests/rx_fitter/pdg_utils'
+#-----------------------------------------------
+@pytest.fixture(autouse=True)
+def _initialize():
+    LogStore.set_level('scripts:pdg_utils', 10)
+
+    pu.Data.cache_path = f'{Data.out_dir}/branching_fractions.json'
+    pu.Data.d_bf       = None
+    if os.path.isfile(pu.Data.cache_path):
+        os.remove(pu.Data.cache_path)
+#-----------------------------------------------
+@pytest.mark.parametrize('decay', Data.l_decay)
+def test_get_bf(decay : str):
+    '''
+    Tests retrieval of branching fractions
+    '''
+    val = pu.get_bf(decay)
+
+    assert 0 < val < 1
+    assert os.path.isfile(pu.Data.cache_path)
+#-----------------------------------------------
+def test_offline(monkeypatch):
+    '''
+    Tests that cached branching fractions are used without the PDG database
+    and that a missing one raises a clear exception
+    '''
+    pu.prefetch(decays=Data.l_decay)
+    l_val = [ pu.get_bf(decay) for decay in Data.l_decay ]
+
+    def _fail():
+        raise FileNotFoundError('No PDG database')
+
+    monkeypatch.setattr(pdg, 'connect', _fail)
+
+    pu.Data.d_bf = None
+    assert l_val == [ pu.get_bf(decay) for decay in Data.l_decay ]
+
+    with pytest.raises(RuntimeError):
+        pu.get_bf('B+ --> psi(2S) K+')
+#-----------------------------------------------
+def test_cache_path(monkeypatch):
+    '''
+    Tests that, by default, the branching fractions are cached in the directory of the CacheManager
+    '''
+    monkeypatch.setattr(pu.Data, 'cache_path', None)
+    with CacheManager.apply_setting(root=f'{Data.out_dir}/cache'):
+        path = pu._get_cache_path()
+
+    assert path == f'{Data.out_dir}/cache/pdg/branching_fractions.json'
+#-----------------------------------------------
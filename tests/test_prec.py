@@ -2,7 +2,10 @@
 Module with tests for the PRec class
 '''
 
+import os
 import mplhep
+import numpy
+import pandas as pnd
 import pytest
 import matplotlib.pyplot as plt
 
@@ -13,6 +16,7 @@ from dmu.logging.log_store  import LogStore
 from rx_selection           import selection as sel
 from rx_data.rdf_getter     import RDFGetter
 from rx_fitter.prec         import PRec
+from rx_fitter.cache_manager import CacheManager
 
 log=LogStore.add_logger('rx_fitter:test_prec')
 #-----------------------------------------------
@@ -304,3 +308,290 @@ def test_apply_settings():
         pdf=obp.get_sum(mass=mass, name='PRec_1', obs=obs)
         PRec.plot_pdf(pdf, 'cache', maxy=maxy, title='no cache test', out_dir=f'{Data.out_dir}/{test}')
 #-----------------------------------------------
+@pytest.mark.parametrize('q2bin', ['jpsi', 'psi2'])
+def test_categories(q2bin : str):
+    '''
+    Tests that splitting candidates with category codes gives the same candidates as the truth matching cuts
+    '''
+    rng  = numpy.random.default_rng(seed=10)
+    size = 10_000
+    df   = pnd.DataFrame({
+        'B_TRUEID'            : rng.choice([521, -521, 511, 531, 0], size=size),
+        'Jpsi_TRUEID'         : rng.choice([443, 100443]           , size=size),
+        'Jpsi_MC_MOTHER_ID'   : rng.choice([100443, 521]           , size=size),
+        'Jpsi_MC_GD_MOTHER_ID': rng.choice([521, 0]                , size=size),
+        'H_MC_MOTHER_ID'      : rng.choice([521, 313]              , size=size),
+        'B_Mass'              : rng.normal(5000, 100               , size=size)})
+
+    obp     = PRec(samples=[], trig='Hlt2RD_BuToKpEE_MVA', q2bin=q2bin, d_weight={'dec' : 0, 'sam' : 0})
+    obp._df = obp._add_categories(df.copy())
+
+    for cut in obp._d_match.values():
+        arr_cat = obp._filter_cut(cut).B_Mass.to_numpy()
+        arr_qry = df.query(cut).B_Mass.to_numpy()
+
+        assert numpy.array_equal(arr_cat, arr_qry)
+#-----------------------------------------------
+@pytest.mark.parametrize('npoints', [0, 1000])
+def test_cached_shapes(npoints : int):
+    '''
+    Tests that templates are cached and reloaded without building the KDEs again,
+    and that without templates, the KDEs are rebuilt with the cached bandwidths.
+    The PDFs from both calls have to be the same.
+    '''
+    obs    = zfit.Space('mass', limits=(4500, 6000))
+    trig   = 'Hlt2RD_BuToKpEE_MVA'
+    l_samp = [
+            'Bu_JpsiX_ee_eq_JpsiInAcc',
+            'Bd_JpsiX_ee_eq_JpsiInAcc',
+            'Bs_JpsiX_ee_eq_JpsiInAcc',
+            ]
+
+    d_wgt= {'dec' : 1, 'sam' : 1}
+    with PRec.apply_setting(template_points=npoints):
+        obp  =PRec(samples=l_samp, trig=trig, q2bin='jpsi', d_weight=d_wgt)
+        pdf_1=obp.get_sum(mass='B_const_mass_M', name='PRec_1', obs=obs)
+
+        obp  =PRec(samples=l_samp, trig=trig, q2bin='jpsi', d_weight=d_wgt)
+        pdf_2=obp.get_sum(mass='B_const_mass_M', name='PRec_1', obs=obs)
+
+    arr_x = numpy.linspace(4500, 6000, 100)
+    arr_1 = numpy.asarray(pdf_1.pdf(arr_x))
+    arr_2 = numpy.asarray(pdf_2.pdf(arr_x))
+
+    assert numpy.array_equal(arr_1, arr_2)
+    assert numpy.array_equal(pdf_1.arr_mass, pdf_2.arr_mass)
+    for mtd_1, mtd_2 in zip(pdf_1.metadata.values(), pdf_2.metadata.values()):
+        assert mtd_1['kind'] == mtd_2['kind']
+    assert [ pdf.name for pdf in pdf_1.pdfs ] == [ pdf.name for pdf in pdf_2.pdfs ]
+#-----------------------------------------------
+@pytest.mark.parametrize('size, wgt, backend', [
+    (       300, 1.0, 'FFT' ),
+    (    10_000, 1.0, 'ISJ' ),
+    (   200_000, 1.0, 'Grid'),
+    ( 1_000_000, 1.0, 'Hist'),
+    ( 1_000_000, 0.0, 'FFT' )])
+def test_backend(size : int, wgt : float, backend : str):
+    '''
+    Tests choice of method used to build PDF, wgt=0 will leave only 100 candidates
+    with non zero weights, i.e. a small effective number of entries
+    '''
+    obs     = zfit.Space('mass', limits=(4500, 6000))
+    arr_wgt = numpy.full(size, wgt)
+    arr_wgt[:100] = 1
+
+    obp     = PRec(samples=[], trig='Hlt2RD_BuToKpEE_MVA', q2bin='jpsi', d_weight={'dec' : 0, 'sam' : 0})
+
+    assert obp._get_backend(arr_wgt, obs=obs) == backend
+#-----------------------------------------------
+def test_get_sums():
+    '''
+    Tests building PDFs for several masses with the same instance
+    '''
+    trig   = 'Hlt2RD_BuToKpEE_MVA'
+    l_samp = [
+            'Bu_JpsiX_ee_eq_JpsiInAcc',
+            'Bd_JpsiX_ee_eq_JpsiInAcc',
+            'Bs_JpsiX_ee_eq_JpsiInAcc',
+            ]
+
+    d_obs = {
+            'B_Mass_smr'     : zfit.Space('B_Mass_smr'    , limits=(4500, 6000)),
+            'B_const_mass_M' : zfit.Space('B_const_mass_M', limits=(5160, 5500))}
+
+    d_wgt = {'dec' : 1, 'sam' : 1}
+    obp   = PRec(samples=l_samp, trig=trig, q2bin='jpsi', d_weight=d_wgt)
+    d_pdf = obp.get_sums(masses=list(d_obs), obs=d_obs, name='PRec')
+
+    for mass, pdf in d_pdf.items():
+        PRec.plot_pdf(pdf, name=mass, title=mass, out_dir=f'{Data.out_dir}/get_sums')
+
+        obp_1 = PRec(samples=l_samp, trig=trig, q2bin='jpsi', d_weight=d_wgt)
+        pdf_1 = obp_1.get_sum(mass=mass, name='PRec', obs=d_obs[mass])
+
+        assert numpy.array_equal(pdf.arr_mass, pdf_1.arr_mass)
+#-----------------------------------------------
+def test_preload():
+    '''
+    Tests that PDFs built from data read once for several q2 bins agree with the ones read for each bin
+    '''
+    trig   = 'Hlt2RD_BuToKpEE_MVA'
+    mass   = 'B_Mass_smr'
+    l_q2bin= ['jpsi', 'psi2']
+    l_samp = [
+            'Bu_JpsiX_ee_eq_JpsiInAcc',
+            'Bd_JpsiX_ee_eq_JpsiInAcc',
+            'Bs_JpsiX_ee_eq_JpsiInAcc',
+            ]
+
+    obs   = zfit.Space(mass, limits=(4500, 6000))
+    d_wgt = {'dec' : 1, 'sam' : 1}
+
+    with PRec.apply_setting(use_cache=False):
+        PRec.preload(samples=l_samp, trig=trig, q2bins=l_q2bin, d_weight=d_wgt)
+        d_pdf = {}
+        for q2bin in l_q2bin:
+            obp          = PRec(samples=l_samp, trig=trig, q2bin=q2bin, d_weight=d_wgt)
+            d_pdf[q2bin] = obp.get_sum(mass=mass, name='PRec', obs=obs)
+
+        PRec.clear_store()
+
+        for q2bin, pdf in d_pdf.items():
+            obp   = PRec(samples=l_samp, trig=trig, q2bin=q2bin, d_weight=d_wgt)
+            pdf_1 = obp.get_sum(mass=mass, name='PRec', obs=obs)
+
+            assert numpy.array_equal(pdf.arr_mass, pdf_1.arr_mass)
+            assert numpy.allclose(pdf.arr_wgt, pdf_1.arr_wgt)
+#-----------------------------------------------
+def test_nworkers():
+    '''
+    Tests that the PDFs built in parallel are the same, and in the same order, as the ones built sequentially
+    '''
+    trig   = 'Hlt2RD_BuToKpEE_MVA'
+    mass   = 'B_const_mass_M'
+    l_samp = [
+            'Bu_JpsiX_ee_eq_JpsiInAcc',
+            'Bd_JpsiX_ee_eq_JpsiInAcc',
+            'Bs_JpsiX_ee_eq_JpsiInAcc',
+            ]
+
+    obs   = zfit.Space(mass, limits=(5160, 5500))
+    d_wgt = {'dec' : 1, 'sam' : 1}
+
+    d_pdf = {}
+    for nworkers in [1, 4]:
+        with PRec.apply_setting(nworkers=nworkers):
+            obp = PRec(samples=l_samp, trig=trig, q2bin='jpsi', d_weight=d_wgt)
+            d_pdf[nworkers] = obp.get_sum(mass=mass, name='PRec', obs=obs)
+
+    pdf_1 = d_pdf[1]
+    pdf_4 = d_pdf[4]
+
+    assert list(pdf_1.metadata) == list(pdf_4.metadata)
+    assert [ pdf.name for pdf in pdf_1.pdfs ] == [ pdf.name for pdf in pdf_4.pdfs ]
+    assert numpy.array_equal(pdf_1.arr_mass, pdf_4.arr_mass)
+#-----------------------------------------------
+def test_shared_candidates():
+    '''
+    Tests that the PDFs of the categories and the sum share a single array of candidates
+    '''
+    trig   = 'Hlt2RD_BuToKpEE_MVA'
+    mass   = 'B_const_mass_M'
+    l_samp = [
+            'Bu_JpsiX_ee_eq_JpsiInAcc',
+            'Bd_JpsiX_ee_eq_JpsiInAcc',
+            'Bs_JpsiX_ee_eq_JpsiInAcc',
+            ]
+
+    obs   = zfit.Space(mass, limits=(5160, 5500))
+    d_wgt = {'dec' : 1, 'sam' : 1}
+    obp   = PRec(samples=l_samp, trig=trig, q2bin='jpsi', d_weight=d_wgt)
+    pdf   = obp.get_sum(mass=mass, name='PRec', obs=obs)
+
+    assert len(pdf.arr_mass) == sum(len(cat_pdf.arr_mass) for cat_pdf in pdf.pdfs)
+
+    for cat_pdf in pdf.pdfs:
+        assert numpy.shares_memory(cat_pdf.arr_can, pdf.arr_can)
+        assert numpy.shares_memory(cat_pdf.arr_wgt, pdf.arr_wgt)
+#-----------------------------------------------
+@pytest.mark.parametrize('kind', ['dec', 'sam', 'bootstrap', 'br'])
+def test_variations(kind : str):
+    '''
+    Tests making variations of the weights, as binned templates and as PDFs
+    '''
+    trig   = 'Hlt2RD_BuToKpEE_MVA'
+    mass   = 'B_const_mass_M'
+    l_samp = [
+            'Bu_JpsiX_ee_eq_JpsiInAcc',
+            'Bd_JpsiX_ee_eq_JpsiInAcc',
+            'Bs_JpsiX_ee_eq_JpsiInAcc',
+            ]
+
+    obs   = zfit.Space(mass, limits=(5160, 5500))
+    d_wgt = {'dec' : 1, 'sam' : 1}
+    d_err = {
+            r'$B_d\to c\bar{c}(\to ee)H_s$' : 0.1,
+            r'$B^+\to c\bar{c}(\to ee)H_s$' : 0.1,
+            r'$B_s\to c\bar{c}(\to ee)H_s$' : 0.2}
+    obp   = PRec(samples=l_samp, trig=trig, q2bin='jpsi', d_weight=d_wgt)
+
+    nvar            = 1 if kind in ['dec', 'sam'] else 200
+    arr_ed, arr_tpl = obp.get_variations(mass=mass, kind=kind, nvar=nvar, br_errors=d_err, binned=True, obs=obs)
+
+    assert arr_tpl.shape == (nvar, len(arr_ed) - 1)
+    assert numpy.allclose(arr_tpl @ numpy.diff(arr_ed), 1)
+
+    l_pdf = obp.get_variations(mass=mass, kind=kind, nvar=3, br_errors=d_err, name='PRec', obs=obs)
+    for index, pdf in enumerate(l_pdf):
+        PRec.plot_pdf(pdf, name=f'{kind}_{index:03}', title=kind, out_dir=f'{Data.out_dir}/variations')
+#-----------------------------------------------
+def test_memoized_selection(monkeypatch):
+    '''
+    Tests that selections are calculated once and recalculated when the custom selection changes,
+    only the ones for the last custom selection are kept
+    '''
+    l_call = []
+    fun    = sel.selection
+    def _selection(**kwargs) -> dict[str,str]:
+        l_call.append(kwargs['process'])
+        return fun(**kwargs)
+
+    monkeypatch.setattr(sel, 'selection', _selection)
+
+    trig   = 'Hlt2RD_BuToKpEE_MVA'
+    l_samp = [
+            'Bu_JpsiX_ee_eq_JpsiInAcc',
+            'Bd_JpsiX_ee_eq_JpsiInAcc',
+            'Bs_JpsiX_ee_eq_JpsiInAcc',
+            ]
+
+    obs   = zfit.Space('B_Mass', limits=(4500, 6000))
+    d_wgt = {'dec' : 1, 'sam' : 1}
+
+    _set_selection(d_cut = {'bdt' : 'mva_cmb > 0.1'})
+    obp   = PRec(samples=l_samp, trig=trig, q2bin='jpsi', d_weight=d_wgt)
+    ide_1 = obp._get_identifier('B_Mass', '(abs(B_TRUEID) == 511)', obs=obs, name='B0')
+    ide_2 = obp._get_identifier('B_Mass', '(abs(B_TRUEID) == 511)', obs=obs, name='B0')
+
+    obp   = PRec(samples=l_samp, trig=trig, q2bin='jpsi', d_weight=d_wgt)
+    ide_3 = obp._get_identifier('B_Mass', '(abs(B_TRUEID) == 511)', obs=obs, name='B0')
+
+    assert ide_1 == ide_2 == ide_3
+    assert len(l_call) <= len(l_samp)
+
+    _set_selection(d_cut = {'bdt' : 'mva_cmb > 0.2'})
+    ide_4 = obp._get_identifier('B_Mass', '(abs(B_TRUEID) == 511)', obs=obs, name='B0')
+    sel.reset_custom_selection()
+
+    assert ide_4 != ide_1
+    assert len(PRec._d_selection) <= len(l_samp)
+#-----------------------------------------------
+def test_load_cached(tmp_path):
+    '''
+    Tests that candidates cached in the old JSON format are moved to a memory mapped .npy file
+    '''
+    trig  = 'Hlt2RD_BuToKpEE_MVA'
+    d_wgt = {'dec' : 1, 'sam' : 1}
+    df    = pnd.DataFrame({
+        'B_Mass'  : [5100., 5200., 5300.],
+        'wgt_br'  : [1.0, 0.5, 2.0],
+        'wgt_dec' : [1.0, 1.0, 2.0],
+        'wgt_sam' : [1.0, 0.5, 1.0]})
+
+    with CacheManager.apply_setting(root=str(tmp_path)):
+        obp       = PRec(samples=[], trig=trig, q2bin='jpsi', d_weight=d_wgt)
+        json_path = obp._json_path_from_identifier('abc')
+        df.to_json(json_path)
+
+        arr_can   = obp._load_cached('abc')
+
+        assert isinstance(arr_can, numpy.memmap)
+        assert not os.path.isfile(json_path)
+        assert os.path.isfile(obp._path_from_identifier('abc'))
+        for name in df.columns:
+            assert numpy.array_equal(arr_can[name], df[name].to_numpy())
+
+        arr_can   = obp._load_cached('abc')
+        assert isinstance(arr_can, numpy.memmap)
+        assert obp._load_cached('xyz') is None
+#-----------------------------------------------
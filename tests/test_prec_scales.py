@@ -113,3 +113,61 @@ def test_seq_scan_scales(mva_cut : str, q2bin : str, process : str) -> None:
 
     ScalesData.collect_mva_wp(process, mva_cut, q2bin, val, err)
 #-------------------------------
+@pytest.mark.parametrize('q2bin', ['low', 'central', 'high'])
+def test_get_scales(q2bin : str):
+    '''
+    Tests calculating the scales of all the processes at once
+    '''
+    signal       = 'bpkpee'
+    l_proc       = dn.get_decays()
+    obj          = PrecScales(q2bin=q2bin)
+    arr_val, cov = obj.get_scales(procs=l_proc, signal=signal)
+
+    assert arr_val.shape == (len(l_proc),)
+    assert cov.shape     == (len(l_proc), len(l_proc))
+    assert numpy.allclose(cov, cov.T)
+    assert numpy.all(numpy.linalg.eigvalsh(cov) > -1e-12 * numpy.abs(cov).max())
+
+    for proc, val, var in zip(l_proc, arr_val, numpy.diag(cov)):
+        obj      = PrecScales(proc=proc, q2bin=q2bin)
+        val_1, _ = obj.get_scale(signal=signal)
+
+        assert val == pytest.approx(val_1)
+        if proc == signal:
+            assert val == 1
+            assert var == pytest.approx(0)
+#-------------------------------
+def test_get_scale_without_process():
+    '''
+    Tests that a single scale cannot be calculated without a process
+    '''
+    obj = PrecScales(q2bin='central')
+    with pytest.raises(ValueError):
+        obj.get_scale(signal='bpkpee')
+#-------------------------------
+def test_zero_efficiency(monkeypatch):
+    '''
+    Tests that a process with zero efficiency gets a zero scale, without changing the scales of the others
+    '''
+    signal = 'bpkpee'
+    l_proc = [ proc for proc in dn.get_decays() if proc != signal ]
+    zero   = l_proc[0]
+    fun    = PrecScales._load_efficiencies
+
+    def _load_efficiencies(self, proc : str):
+        df = fun(self, proc).copy()
+        df.loc[df.Process == zero, 'Passed'] = 0
+
+        return df
+
+    obj          = PrecScales(q2bin='central')
+    arr_exp, _   = obj.get_scales(procs=l_proc, signal=signal)
+
+    monkeypatch.setattr(PrecScales, '_load_efficiencies', _load_efficiencies)
+    obj          = PrecScales(q2bin='central')
+    arr_val, cov = obj.get_scales(procs=l_proc, signal=signal)
+
+    assert arr_val[0] == 0
+    assert numpy.all(numpy.isfinite(cov))
+    assert numpy.allclose(arr_val[1:], arr_exp[1:])
+#-------------------------------
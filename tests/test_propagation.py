@@ -0,0 +1,131 @@
+'''
+Module with tests for functions in propagation module, validated against jacobi
+'''
+import numpy
+import jacobi
+import pytest
+
+from dmu.logging.log_store import LogStore
+from rx_fitter             import propagation as prp
+
+log=LogStore.add_logger('rx_fitter:test_propagation')
+#-----------------------------------------------
+def _get_inputs(size : int, seed : int = 10) -> tuple[numpy.ndarray,numpy.ndarray]:
+    rng = numpy.random.default_rng(seed=seed)
+    val = rng.uniform(0.1, 2.0, size=size)
+    err = rng.uniform(0.0, 0.2, size=size) * val
+    mat = rng.uniform(-1, 1, size=(size, size))
+    cor = mat @ mat.T
+    cor = cor / numpy.sqrt(numpy.outer(numpy.diag(cor), numpy.diag(cor)))
+    cov = cor * numpy.outer(err, err)
+
+    return val, cov
+#-----------------------------------------------
+def test_power_product():
+    '''
+    Tests propagation to products of powers with correlated inputs
+    '''
+    val, cov = _get_inputs(size=5)
+    arr_exp  = numpy.array([[1, 1, -1, 0, 0], [0, 2, 0, -1, 1], [0, 0, 0, 0, 0]])
+
+    out, out_cov = prp.power_product(val, cov, arr_exp)
+    exp, exp_cov = jacobi.propagate(lambda x : numpy.prod(x ** arr_exp, axis=1), val, cov)
+
+    assert numpy.allclose(out, exp)
+    assert numpy.allclose(out_cov, exp_cov, rtol=1e-6, atol=1e-12)
+    assert out[2] == 1
+#-----------------------------------------------
+def test_power_product_batch():
+    '''
+    Tests that several sets of inputs are propagated at once
+    '''
+    l_inp   = [ _get_inputs(size=3, seed=seed) for seed in range(4) ]
+    arr_val = numpy.array([ val for val, _ in l_inp ])
+    arr_cov = numpy.array([ cov for _, cov in l_inp ])
+    arr_exp = numpy.array([[1, -1, 1]])
+
+    out, out_cov = prp.power_product(arr_val, arr_cov, arr_exp)
+    for index, (val, cov) in enumerate(l_inp):
+        exp, exp_cov = prp.power_product(val, cov, arr_exp)
+
+        assert numpy.allclose(out[index]    , exp)
+        assert numpy.allclose(out_cov[index], exp_cov)
+#-----------------------------------------------
+def test_power_product_zero():
+    '''
+    Tests that zero inputs only change the outputs where they are used, e.g. efficiencies of zero
+    '''
+    val, cov = _get_inputs(size=4)
+    val[1]   = 0
+    arr_exp  = numpy.array([[1, 1, -1, 0], [1, 0, -1, 1]])
+
+    out, out_cov = prp.power_product(val, cov, arr_exp)
+    exp, exp_cov = jacobi.propagate(lambda x : numpy.prod(x ** arr_exp, axis=1), val, cov)
+
+    assert out[0] == 0
+    assert numpy.all(numpy.isfinite(out_cov))
+    assert numpy.allclose(out, exp)
+    assert numpy.allclose(out_cov, exp_cov, rtol=1e-6, atol=1e-12)
+
+    with pytest.raises(ValueError):
+        prp.power_product(val, cov, numpy.array([[1, -1, 0, 0]]))
+#-----------------------------------------------
+def test_product():
+    '''
+    Tests product of independent inputs
+    '''
+    val, cov = _get_inputs(size=4)
+    err      = numpy.sqrt(numpy.diag(cov))
+
+    out, out_err = prp.product(val, err)
+    exp, exp_var = jacobi.propagate(numpy.prod, val, err ** 2)
+
+    assert out     == pytest.approx(exp)
+    assert out_err == pytest.approx(numpy.sqrt(exp_var), rel=1e-6)
+#-----------------------------------------------
+@pytest.mark.parametrize('kind', ['ratio', 'difference'])
+def test_binary(kind : str):
+    '''
+    Tests ratios and differences of arrays of independent inputs
+    '''
+    val_1, cov_1 = _get_inputs(size=6, seed=1)
+    val_2, cov_2 = _get_inputs(size=6, seed=2)
+    err_1        = numpy.sqrt(numpy.diag(cov_1))
+    err_2        = numpy.sqrt(numpy.diag(cov_2))
+
+    fun          = getattr(prp, kind)
+    out, out_err = fun(val_1, err_1, val_2, err_2)
+
+    for index in range(6):
+        fexp         = (lambda x : x[0] / x[1]) if kind == 'ratio' else (lambda x : x[0] - x[1])
+        exp, exp_var = jacobi.propagate(fexp, [val_1[index], val_2[index]], [err_1[index] ** 2, err_2[index] ** 2])
+
+        assert out[index]     == pytest.approx(exp)
+        assert out_err[index] == pytest.approx(numpy.sqrt(exp_var), rel=1e-6)
+#-----------------------------------------------
+def test_normalize():
+    '''
+    Tests propagation to fractions
+    '''
+    val, cov     = _get_inputs(size=3)
+    out, out_cov = prp.normalize(val, cov)
+    exp, exp_cov = jacobi.propagate(lambda x : x / numpy.sum(x), val, cov)
+
+    assert numpy.allclose(out, exp)
+    assert numpy.allclose(out_cov, exp_cov, rtol=1e-6, atol=1e-12)
+#-----------------------------------------------
+def test_from_jacobian():
+    '''
+    Tests propagation with a Jacobian provided by the caller, for a linear function
+    '''
+    val, cov = _get_inputs(size=4)
+    arr_jac  = numpy.array([[1, -1, 0, 0], [0, 2, 0.5, -3]])
+
+    out_cov    = prp.from_jacobian(arr_jac, cov)
+    _, exp_cov = jacobi.propagate(lambda x : arr_jac @ x, val, cov)
+    out_var    = prp.from_jacobian(arr_jac, numpy.diag(cov))
+    _, exp_var = jacobi.propagate(lambda x : arr_jac @ x, val, numpy.diag(numpy.diag(cov)))
+
+    assert numpy.allclose(out_cov, exp_cov, rtol=1e-6, atol=1e-12)
+    assert numpy.allclose(out_var, exp_var, rtol=1e-6, atol=1e-12)
+#-----------------------------------------------
@@ -2,6 +2,7 @@
 Module with functions testing SignalScales class
 '''
 
+import numpy
 import pytest
 from dmu.logging.log_store   import LogStore
 from rx_fitter.signal_scales import FitParameters
@@ -76,3 +77,18 @@ def test_get_brem_values(name : str):
 
     log.info(f'Value: {val:.3f}')
     log.info(f'Error: {err:.3f}')
+# ------------------------------------
+def test_get_parameter_scales():
+    '''
+    Tests getting all scales and resolutions at once
+    '''
+    obj          = FitParameters()
+    arr_val, cov = obj.get_parameter_scales(names=Data.l_sig_par)
+
+    assert cov.shape == (len(Data.l_sig_par), len(Data.l_sig_par))
+    for index, name in enumerate(Data.l_sig_par):
+        val, err = obj.get_parameter_scale(name=name)
+
+        assert arr_val[index]                == pytest.approx(val)
+        assert numpy.sqrt(cov[index][index]) == pytest.approx(err)
+# ------------------------------------
@@ -0,0 +1,56 @@
+'''
+Module with tests for TemplatePDF class
+'''
+import numpy
+import pytest
+
+from dmu.stats.zfit         import zfit
+from dmu.logging.log_store  import LogStore
+from rx_fitter.template_pdf import TemplatePDF, tabulate
+
+log=LogStore.add_logger('rx_fitter:test_template_pdf')
+#-----------------------------------------------
+@pytest.fixture(scope='session', autouse=True)
+def _initialize():
+    LogStore.set_level('rx_fitter:template_pdf', 10)
+#-----------------------------------------------
+def _get_kde(obs) -> zfit.pdf.KDE1DimFFT:
+    rng      = numpy.random.default_rng(seed=10)
+    arr_mass = rng.normal(loc=5000, scale=200, size=5_000)
+    arr_mass = arr_mass[(arr_mass > 4500) & (arr_mass < 6000)]
+    pdf      = zfit.pdf.KDE1DimFFT(arr_mass, obs=obs, name='kde')
+
+    return pdf
+#-----------------------------------------------
+def test_tabulate():
+    '''
+    Tests that the template agrees with the tabulated PDF
+    '''
+    obs     = zfit.Space('mass', limits=(4500, 6000))
+    kde     = _get_kde(obs)
+    tpl     = tabulate(kde, npoints=1000)
+
+    arr_x   = numpy.linspace(4500, 6000, 777)
+    arr_kde = numpy.asarray(kde.pdf(arr_x))
+    arr_tpl = numpy.asarray(tpl.pdf(arr_x))
+
+    assert numpy.allclose(arr_tpl, arr_kde, rtol=0, atol=1e-3 * arr_kde.max())
+#-----------------------------------------------
+def test_integral():
+    '''
+    Tests normalization and integral in sub-ranges
+    '''
+    obs      = zfit.Space('mass', limits=(0, 10))
+    arr_x    = numpy.linspace(0, 10, 101)
+    arr_y    = numpy.exp(-0.5 * ((arr_x - 5) / 1.3) ** 2)
+    tpl      = TemplatePDF(obs=obs, values=arr_y)
+
+    tot_int  = float(tpl.integrate(limits=(0, 10))[0])
+    sub_int  = float(tpl.integrate(limits=(2.3, 7.7))[0])
+
+    arr_fine = numpy.linspace(2.3, 7.7, 200_001)
+    num_int  = numpy.trapezoid(numpy.asarray(tpl.pdf(arr_fine)), arr_fine)
+
+    assert tot_int == pytest.approx(1.0, abs=1e-9)
+    assert sub_int == pytest.approx(num_int, abs=1e-6)
+#-----------------------------------------------